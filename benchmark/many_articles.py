@@ -0,0 +1,47 @@
+from __future__ import print_function
+import os
+import io
+import sys
+import time
+import shutil
+import tempfile
+
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_path, '..'))
+from bleualign.align import Aligner
+
+# a bitext of many short articles: the eval1989 sentences (and their translations), cut into articles of a few sentences.
+# with several processes, the throughput depends on how fast the main process gets the result of each article.
+def write_articles(directory, sentences_per_article, repeat):
+	eval_dir = os.path.join(current_path, '..', 'eval')
+	texts = {}
+	for name, markers in (('eval1989.de', 'eval1989.de'), ('eval1989.google.fr', 'eval1989.de'), ('eval1989.fr', 'eval1989.fr')):
+		with io.open(os.path.join(eval_dir, markers), encoding='UTF-8') as m:
+			with io.open(os.path.join(eval_dir, name), encoding='UTF-8') as f:
+				texts[name] = [line.rstrip('\n') for line, marker in zip(f, m) if marker.strip() != '.EOA']
+	# the target text is cut at proportional positions
+	num_articles = len(texts['eval1989.de']) // sentences_per_article
+	paths = {}
+	for name, lines in texts.items():
+		paths[name] = os.path.join(directory, name)
+		articles = ['\n'.join(lines[i*len(lines)//num_articles:(i+1)*len(lines)//num_articles]) for i in range(num_articles)]
+		with io.open(paths[name], 'w', encoding='UTF-8') as out:
+			out.write('\n.EOA\n'.join(articles*repeat) + '\n')
+	return paths, num_articles*repeat
+
+if __name__ == '__main__':
+	sentences_per_article = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+	repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+	directory = tempfile.mkdtemp()
+	try:
+		paths, num_articles = write_articles(directory, sentences_per_article, repeat)
+		print('{0} articles of {1} sentences'.format(num_articles, sentences_per_article))
+		for num_processes in (1, 2, 4):
+			a = Aligner({'srcfile': paths['eval1989.de'], 'targetfile': paths['eval1989.fr'], 'srctotarget': [paths['eval1989.google.fr']],
+				'num_processes': num_processes, 'verbosity': 0})
+			start = time.time()
+			a.mainloop()
+			seconds = time.time() - start
+			print('{0} processes: {1:8.1f} s {2:8.1f} articles/s'.format(num_processes, seconds, num_articles / seconds))
+	finally:
+		shutil.rmtree(directory)
@@ -0,0 +1,97 @@
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+import resource
+import multiprocessing
+
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_path, '..'))
+import bleualign.align
+from bleualign.align import Aligner
+
+# Aligner.pathfinder() as it was before typed storage: nested lists of floats and of pointer strings
+def old_pathfinder(scoredict, num_tests, num_targets):
+	matrix = [[0 for column in range(num_targets+1)]]
+	pointers = []
+	for i in range(num_tests):
+		alignments = dict([(target, score) for (score, target, correct) in scoredict[i]])
+		row = [0]
+		row_pointers = []
+		for j in range(num_targets):
+			best_score = matrix[-1][j+1]
+			best_pointer = '^'
+			if row[j] > best_score:
+				best_score = row[j]
+				best_pointer = '<'
+			if j in alignments:
+				score = alignments[j] + matrix[-1][j]
+				if score > best_score:
+					best_score = score
+					best_pointer = 'match'
+			row.append(best_score)
+			row_pointers.append(best_pointer)
+		matrix = [row]
+		pointers.append(row_pointers)
+	i, j = num_tests-1, num_targets-1
+	best_path = []
+	while i >= 0 and j >= 0:
+		pointer = pointers[i][j]
+		if pointer == '^':
+			i -= 1
+		elif pointer == '<':
+			j -= 1
+		else:
+			best_path.append((i, j))
+			i -= 1
+			j -= 1
+	best_path.reverse()
+	return best_path
+
+# candidates close to the diagonal, like the ones eval_sents() finds for a parallel article
+def make_scoredict(num_tests, num_targets, alternatives = 3):
+	rand = random.Random(0)
+	scoredict = {}
+	for i in range(num_tests):
+		center = i * num_targets // num_tests
+		targets = set(min(num_targets-1, max(0, center + rand.randint(-5, 5))) for k in range(alternatives))
+		scoredict[i] = sorted([(rand.random(), j, [1]) for j in targets], reverse = True)
+	return scoredict
+
+def run(name, size, queue):
+	eval_dir = os.path.join(current_path, '..', 'eval')
+	a = Aligner({'srcfile': os.path.join(eval_dir, 'eval1989.de'), 'targetfile': os.path.join(eval_dir, 'eval1989.fr'),
+		'srctotarget': [os.path.join(eval_dir, 'eval1989.google.fr')], 'verbosity': 0})
+	a.scoredict = make_scoredict(size, size)
+	baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	start = time.time()
+	if name == 'lists (before)':
+		path = old_pathfinder(a.scoredict, size, size)
+	elif name == 'sparse':
+		a.pathfinder_sparse(range(size), range(size))
+		path = a.bleualign
+	elif name == 'linear memory':
+		a.pathfinder_linear(range(size), range(size))
+		path = a.bleualign
+	else:
+		bleualign.align.numpy_enabled = int(name == 'numpy')
+		a.pathfinder_dense(range(size), range(size))
+		path = a.bleualign
+	seconds = time.time() - start
+	# ru_maxrss is in kilobytes on Linux
+	queue.put((seconds, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024.0, len(path)))
+
+if __name__ == '__main__':
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+	print('best path through a {0}x{0} article, 3 candidates per sentence'.format(size))
+	names = ['lists (before)', 'array', 'linear memory', 'sparse']
+	if bleualign.align.numpy_enabled:
+		names.insert(2, 'numpy')
+	for name in names:
+		queue = multiprocessing.Queue()
+		process = multiprocessing.Process(target = run, args = (name, size, queue))
+		process.start()
+		seconds, megabytes, length = queue.get()
+		process.join()
+		print('{0:16} {1:8.1f} s {2:8.0f} MB peak  (path of {3} alignments)'.format(name, seconds, megabytes, length))
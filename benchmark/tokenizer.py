@@ -0,0 +1,45 @@
+from __future__ import print_function
+import os
+import io
+import re
+import sys
+import time
+import xml.sax.saxutils
+
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_path, '..'))
+import bleualign.score as bleu
+
+# bleu.normalize() as it was before the single-pass tokenizer and the memo
+def old_normalize(s):
+	for (pattern, replace) in bleu.normalize1:
+		s = re.sub(pattern, replace, s)
+	s = xml.sax.saxutils.unescape(s, {'&quot;':'"'})
+	s = " %s " % s
+	s = s.lower()
+	return [tok for tok in bleu.normalize3.split(s) if tok and tok != ' ']
+
+def sentences_per_second(function, sentences, repeat = 5):
+	start = time.time()
+	for i in range(repeat):
+		for sentence in sentences:
+			function(sentence)
+	return len(sentences) * repeat / (time.time() - start)
+
+if __name__ == '__main__':
+	eval_dir = os.path.join(current_path, '..', 'eval')
+	sentences = []
+	for filename in sorted(os.listdir(eval_dir)):
+		if filename.endswith('.de') or filename.endswith('.fr'):
+			with io.open(os.path.join(eval_dir, filename), encoding='UTF-8') as f:
+				sentences.extend(line.rstrip('\n') for line in f)
+	print('{0} sentences from eval corpora'.format(len(sentences)))
+	print('before (regex split):    {0:10.0f} sentences/s'.format(
+		sentences_per_second(old_normalize, sentences)))
+	print('after (single pass):     {0:10.0f} sentences/s'.format(
+		sentences_per_second(bleu.normalize_uncached, sentences)))
+	bleu.normalize_memo.clear()
+	print('after (memo, first run): {0:10.0f} sentences/s'.format(
+		sentences_per_second(bleu.normalize, sentences, repeat = 1)))
+	print('after (memo, repeated):  {0:10.0f} sentences/s'.format(
+		sentences_per_second(bleu.normalize, sentences)))
@@ -8,9 +8,16 @@ from __future__ import division,print_function,unicode_literals
 import sys
 import time
 import math
+import heapq
+from bisect import bisect_left, bisect_right
+from array import array
 from operator import itemgetter
+from collections import deque
+from functools import reduce
 from bleualign.gale_church import align_texts
 import bleualign.score as bleu
+from bleualign.cache import TokenCache
+from bleualign.index import ArticleIndex
 from bleualign.utils import evaluate, finalevaluation
 import io
 import platform
@@ -18,38 +25,88 @@ import platform
 
 if sys.version_info >= (2,6) and platform.system() != "Windows":
   import multiprocessing
+  try:
+    from queue import Empty
+  except ImportError:
+    from Queue import Empty
   multiprocessing_enabled = 1
 else:
   multiprocessing_enabled = 0
 
+#multiprocessing.shared_memory (Python 3.8) is only needed for the shared_memory option
+try:
+  import bleualign.shared as shared
+  shared_memory_enabled = 1
+except ImportError:
+  shared_memory_enabled = 0
+
+#numpy is only needed for the vectorized BLEU backend
+try:
+  import bleualign.vectorized as vectorized
+  numpy_enabled = 1
+except ImportError:
+  numpy_enabled = 0
+
+#backpointers of the dense pathfinders. if scores are equal, UP is preferred to LEFT to MATCH
+UP, LEFT, MATCH = 0, 1, 2
+
+#regions of the score matrix up to this size are solved directly by pathfinder_linear()
+linear_block_cells = 2**16
+
+#number of gaps whose candidates are scored with one call of eval_sents() (see gapfinder()). Batches save the setup cost of the numpy backend;
+#the Python backend is fastest with small data structures, and scores gaps one by one.
+gap_batch_size = {'python': 1, 'numpy': 16}
+
+#the first BLEU pass keeps the scores of each source sentence against the targets within this distance of its best alternatives,
+#which are the targets that gapfiller() is likely to compare it to (see eval_sents())
+score_cache_distance = 32
+
+
+#read a text line by line, together with the corresponding lines of its translations.
+#yields (line, [translated lines]) for each line, and None at each end_of_article_marker.
+#with factored input, line is (raw line, factored line).
+def read_lines(text,translations,options):
+
+    for line in text:
+
+        if line.rstrip() == options['end_of_article_marker']:
+            for f in translations:
+                f.readline()
+            yield None
+            continue
+
+        translated = [f.readline().rstrip() for f in translations]
+
+        if options['factored']:
+            rawline = ' '.join(word.split('|')[0] for word in line.split())
+            yield (rawline,line.rstrip()), translated
+        else:
+            yield line.rstrip(), translated
+
 
 def collect_article(src,srctotarget,target,targettosrc,options):
 
+    sides = [(read_lines(src,srctotarget,options),srctotarget),(read_lines(target,targettosrc,options),targettosrc)]
+
     EOF = False
     while not EOF:
 
         all_texts = []
         all_translations = []
 
-        for text,translations in [(src,srctotarget),(target,targettosrc)]:
+        for lines,translations in sides:
             textlist = []
             translist = [[] for i in translations]
 
-            for line in text:
+            for item in lines:
 
-                if line.rstrip() == options['end_of_article_marker']:
-                    for f in translations:
-                        f.readline()
+                if item is None:
                     break
 
-                for i,f in enumerate(translations):
-                    translist[i].append(f.readline().rstrip())
-
-                if options['factored']:
-                    rawline = ' '.join(word.split('|')[0] for word in line.split())
-                    textlist.append((rawline,line.rstrip()))
-                else:
-                    textlist.append(line.rstrip())
+                line,translated = item
+                for i,t in enumerate(translated):
+                    translist[i].append(t)
+                textlist.append(line)
             else:
                 EOF = True
 
@@ -61,17 +118,234 @@ def collect_article(src,srctotarget,target,targettosrc,options):
         yield sourcelist,targetlist,translist1,translist2
 
 
-#takes a queue as argument and puts all articles to be aligned in it.
+#read article i of the input files from an ArticleIndex (see bleualign.index), in the format of collect_article()
+def read_article(index,i,options):
+    src,srctotarget,target,targettosrc = index.streams(i)
+    return next(collect_article(src,srctotarget,target,targettosrc,options))
+
+
+#a sentence pair is only used as anchor if the sentences share at least this many rare n-grams
+anchor_min_ngrams = 2
+
+#find high-confidence 1-to-1 alignments in an article: pairs of sentences that share n-grams which occur in no other sentence
+#of either text. The best monotonic chain of such pairs (see best_chain()) is returned as a list of (sourceID, targetID).
+def find_anchors(sourcelist,targetlist,translist1,translist2,options):
+
+    if options['factored']:
+        sourcelist = [item[0] for item in sourcelist]
+        targetlist = [item[0] for item in targetlist]
+
+    #compare a translation to the other text, or both texts if there is none
+    mirror = False
+    if translist1:
+        tests, refs = translist1[0], targetlist
+    elif translist2:
+        tests, refs, mirror = translist2[0], sourcelist, True
+    else:
+        tests, refs = sourcelist, targetlist
+
+    n = options['bleu_ngrams']
+    unique = []
+    for sentences in (tests, refs):
+        #n-grams of the highest order, and the sentence they occur in (None if they occur in more than one)
+        where = {}
+        for ID, sentence in enumerate(sentences):
+            if options['bleu_charlevel']:
+                sentence = tuple(sentence)
+            for ngram in bleu.count_ngrams(bleu.normalize(sentence), n):
+                if len(ngram) == n:
+                    where[ngram] = ID if ngram not in where else None
+        unique.append(where)
+
+    shared = {}
+    for ngram, testID in unique[0].items():
+        refID = unique[1].get(ngram)
+        if testID is not None and refID is not None:
+            shared[(testID, refID)] = shared.get((testID, refID), 0) + 1
+
+    scoredict = {}
+    for (testID, refID), count in shared.items():
+        if count >= anchor_min_ngrams:
+            scoredict.setdefault(testID, []).append((count, refID, None))
+
+    anchors = best_chain(scoredict, len(tests), len(refs))
+    if mirror:
+        anchors = [(j, i) for (i, j) in anchors]
+    return anchors
+
+
+#split an article with more than options['anchor_split'] source sentences into independent pieces of at least this length.
+#pieces are only cut between two consecutive anchors (i,j) and (i+1,j+1), which are very likely to be aligned.
+#returns a list of (first source sentence, end of source sentences, first target sentence, end of target sentences) for each piece,
+#or [None] if the article is not split.
+def split_article(article,options):
+
+    sourcelist,targetlist,translist1,translist2 = article
+    if not options['anchor_split'] or options['galechurch'] or len(sourcelist) <= options['anchor_split']:
+        return [None]
+
+    anchors = set(find_anchors(sourcelist,targetlist,translist1,translist2,options))
+    cuts = [(0,0)]
+    for i,j in sorted(anchors):
+        if (i+1,j+1) in anchors and i+1-cuts[-1][0] >= options['anchor_split'] and len(sourcelist)-i-1 >= options['anchor_split']:
+            cuts.append((i+1,j+1))
+    cuts.append((len(sourcelist),len(targetlist)))
+
+    if len(cuts) == 2:
+        return [None]
+    return [(src_start,src_end,target_start,target_end) for (src_start,target_start),(src_end,target_end) in zip(cuts,cuts[1:])]
+
+
+#join the results of the pieces of an article (see split_article()):
+#a list of (piece, multialign, bleualign, scoredict) for each piece, with IDs relative to the piece.
+#bleualign and scoredict are those of the last alignment run (see process()), which is in the target-to-source direction if there are translations of the target text.
+def stitch_pieces(pieces, translist2):
+
+    if len(pieces) == 1 and pieces[0][0] is None:
+        return pieces[0][1:]
+
+    multialign, bleualign, scoredict = [], [], {}
+    for (src_offset,src_end,target_offset,target_end),piece_multialign,piece_bleualign,piece_scoredict in pieces:
+
+        for (src,target),aligntype in piece_multialign:
+            multialign.append(((tuple([ID+src_offset for ID in src]),tuple([ID+target_offset for ID in target])),aligntype))
+
+        if translist2:
+            src_offset, target_offset = target_offset, src_offset
+        bleualign.extend([(i+src_offset,j+target_offset) for (i,j) in piece_bleualign])
+        for i,alternatives in (piece_scoredict or {}).items():
+            scoredict[i+src_offset] = [(score,j+target_offset,correct) for (score,j,correct) in alternatives]
+
+    return multialign, bleualign, scoredict
+
+
+#weighted longest increasing chain of the candidate pairs in scoredict ({testID: [(score, targetID, ...), ...]}), using a Fenwick tree.
+#the path is the same as the one of Aligner.pathfinder_dense(), including ties, since the dense matrix has the score of the best chain
+#in the rectangle up to each cell, and its backpointers prefer UP to LEFT to MATCH.
+def best_chain(scoredict, num_tests, num_targets):
+
+    #Fenwick tree over target IDs: best score of a chain ending at or before each target, among the rows seen so far
+    tree = [0]*(num_targets+1)
+    #for each chain score: the candidates that reach it, as (i, j, score of the chain before (i,j)), ordered by i and j
+    reached = {}
+
+    for i in range(num_tests):
+        row = []
+        alignments = dict([(target, score) for (score, target, correct) in scoredict.get(i, ())])
+        for target, score in sorted(alignments.items()):
+            #best chain in rows 0..i-1 and columns 0..target-1
+            before = 0
+            k = target
+            while k > 0:
+                if tree[k] > before:
+                    before = tree[k]
+                k -= k & -k
+            row.append((target, score + before, before))
+
+        for target, total, before in row:
+            reached.setdefault(total, []).append((i, target, before))
+            k = target + 1
+            while k <= num_targets:
+                if total > tree[k]:
+                    tree[k] = total
+                k += k & -k
+
+    #start from the best chain overall. like the dense backtrace, we take the lowest row and then the leftmost column that reaches
+    #the current score, and continue with the best chain above and left of it (its score is strictly lower, so each list is searched once)
+    best = 0
+    k = num_targets
+    while k > 0:
+        if tree[k] > best:
+            best = tree[k]
+        k -= k & -k
+
+    best_path = []
+    j = num_targets-1
+    while best > 0:
+        for i, target, before in reached[best]:
+            if target <= j:
+                break
+        best_path.append((i, target))
+        best, j = before, target-1
+
+    best_path.reverse()
+    return best_path
+
+
+#group links between source and target sentences ((i, j) index pairs) into beads: the connected components of the links,
+#as pairs of sorted tuples of source and target indices, ordered by their first source index.
+#components are found with union-find, in which source i is node i and target j is node -1-j.
+def link_beads(links):
+
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        #path compression
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for i, j in links:
+        parent.setdefault(i, i)
+        parent.setdefault(-1-j, -1-j)
+        source_root, target_root = find(i), find(-1-j)
+        if source_root != target_root:
+            parent[source_root] = target_root
+
+    beads = {}
+    for i, j in links:
+        sources, targets = beads.setdefault(find(i), (set(), set()))
+        sources.add(i)
+        targets.add(j)
+
+    return sorted((tuple(sorted(sources)), tuple(sorted(targets))) for sources, targets in beads.values())
+
+
+#takes a queue as argument and puts all articles to be aligned in it. At the end, the number of tasks is put in the queue of results.
 #best call this in a separate process because we limit the queue size for memory reasons
-def tasks_producer(tasks,num_tasks,data,num_processes):
-    for i,task in enumerate(collect_article(*data)):
-        num_tasks.value += 1
-        tasks.put((i,task),True)
-        
+#long articles are split into pieces (see split_article()), which are separate tasks; each task is sent with
+#(article number, piece number, number of pieces of the article, piece) and the whole article.
+#with an ArticleIndex, the workers read the articles themselves, and None is sent instead of the article;
+#articles are then only read here if they need to be split. With the shared_memory option, a SharedArticle is sent instead.
+def tasks_producer(tasks,finished,data,num_processes,index=None):
+    options = data[-1]
+    task_id = 0
+    if index is None:
+        articles = collect_article(*data)
+    elif options['anchor_split']:
+        articles = (read_article(index,i,options) for i in range(len(index)))
+    else:
+        articles = (None for i in range(len(index)))
+    for i,article in enumerate(articles):
+        pieces = split_article(article,options) if article is not None else [None]
+        if options['shared_memory']:
+            article = shared.share_article(article,options['factored'])
+        for k,piece in enumerate(pieces):
+            tasks.put((task_id,((i,k,len(pieces),piece),article if index is None else None)),True)
+            task_id += 1
+
     #poison pills
     for i in range(num_processes):
         tasks.put((None,None))
-    num_tasks.value -= 1 # only if this point is reached, process finishes when all tasks are done.
+    finished.put((None,task_id))
+
+#the alignments of an article, as a list of ((source IDs, target IDs), alignment type) in the order they were found.
+#the aligned pairs, and the 1-to-1 alignments of the first BLEU pass (see pathfinder()), are also kept in sets,
+#so that gapfinder() and addtoAlignments() can look them up in constant time. Alignments are only added with append().
+class Alignments(list):
+
+    def __init__(self, bleualign=()):
+        list.__init__(self)
+        self.pairs = set()
+        self.bleu_pairs = set(bleualign)
+
+    def append(self, alignment):
+        list.append(self, alignment)
+        self.pairs.add(alignment[0])
+
 
 class Aligner:
     default_options = {
@@ -99,6 +373,49 @@ class Aligner:
         #it is a good idea to also increase bleu_ngrams when switching to character-level BLEU
         'bleu_charlevel' : False,
 
+        #implementation of eval_sents: 'python' compares sentence pairs one by one, 'numpy' scores all pairs of an article at once (requires numpy)
+        #both produce the same alignments
+        'bleu_backend' : 'python',
+
+        #only compare sentences that lie close to the diagonal of the article (assuming the translation is roughly monotone)
+        #None compares all sentence pairs; an integer is the maximal distance (in target sentences) from the length-proportional diagonal;
+        #a float between 0 and 1 is the maximal distance relative to the number of target sentences.
+        #the band is doubled automatically if the best path, or the best candidate of a test sentence, touches its edge.
+        #results are close to, but not the same as, those of a full comparison: on eval1989 and eval1957, f1 stays within 0.5 points of it
+        #for bands from 1 to 40 sentences and from 0.05 to 0.2.
+        'band_width' : None,
+
+        #algorithm that finds the best path of 1-to-1 alignments: 'sparse' only looks at the candidate pairs found by eval_sents(),
+        #'dense' fills the full score matrix of each article (in the band, if there is one). Both find the same path.
+        'pathfinder' : 'sparse',
+        #the dense pathfinder keeps a backpointer for each cell. Above this many cells, it switches to a divide-and-conquer search that finds
+        #the same path in linear memory, at the cost of about twice the computation.
+        'dense_max_cells' : 20000000,
+
+        #split articles with more than this many source sentences into independent pieces of at least this length, at sentence pairs that
+        #share rare n-grams (see split_article()). Pieces are aligned separately (and in parallel with num_processes > 1).
+        #this is meant for long texts without reliable end_of_article_marker. None disables it.
+        'anchor_split' : None,
+
+        #align in a sliding window of this many sentences of each text, instead of whole articles, for input that is too long to be
+        #held in memory or that arrives line by line (e.g. subtitles). Alignments in the first half of the window are written out as soon as
+        #the window is full (see stream_cut()); end_of_article_marker is still respected. With filter, the written part of each window is filtered
+        #on its own (filterthreshold is relative to it), so that nothing is held until the end. None disables it.
+        'stream_window' : None,
+
+        #with num_processes > 1, send each article to the workers in a shared memory block instead of pickling its sentences
+        #(see bleualign.shared). Workers then read sentences from the block as they need them, instead of holding their own copy,
+        #which saves time and memory on very long articles. Requires Python 3.8.
+        'shared_memory' : False,
+
+        #file name of a persistent cache of normalized sentences (sqlite3 database), which speeds up repeated runs on the same corpus.
+        #cook_cache_size is the maximal number of sentences in the cache; the least recently used ones are removed first.
+        'cook_cache' : None, 'cook_cache_size' : 1000000,
+
+        #the tokenizer (bleu.normalize()) remembers the tokens of this many sentences, which are normalized again when gaps are filled.
+        #the memo is cleared between articles, and each process has its own; larger values help only for articles with more sentences.
+        'normalize_memo_size' : 5000,
+
         #consider N to 1 (and 1 to N) alignment in gapfilling (complexity is size_of_gap*value^2, so don't turn this unnecessarily high)
         #also, there are potential precision issues.
         #set to 1 to disable bleu-based 1 to N alignments and let gale & church fill the gaps
@@ -107,6 +424,11 @@ class Aligner:
         #do only gale-church, no bleualign
         'galechurch': None,
 
+        #only search gale & church alignments that lie close to the diagonal of each block (in gaps, or whole articles with 'galechurch').
+        #same values as 'band_width'; the band is doubled automatically if the best path touches its edge.
+        #None searches the full block, which costs time and memory proportional to the product of the block lengths.
+        'galechurch_band': None,
+
         #gapfillheuristics: what to do with sentences that aren't aligned one-to-one by the first BLEU pass, nor have a 1 to N alignment validated by BLEU?
         #possible members are: bleu1to1, galechurch
         #what they do is commented in the source code
@@ -153,6 +475,9 @@ class Aligner:
       self.close_out_bad1, self.close_out_bad2 = False, False 
       self.options = self.default_options.copy()
       self.options.update(options)
+      self.cook_cache = None
+      self.cooked_article = None
+      self.score_cache = None
       
       if not self.options['srcfile']:
         raise ValueError('Source file not specified.')
@@ -161,6 +486,19 @@ class Aligner:
       if not self.options['srctotarget'] and not self.options['targettosrc']\
             and not self.options['no_translation_override']:
         raise ValueError("ERROR: no translation available: BLEU scores can be computed between the source and target text, but this is not the intended usage of Bleualign and may result in poor performance! If you're *really* sure that this is what you want, set 'galechurch' for the options.")
+      if self.options['bleu_backend'] not in ('python', 'numpy'):
+        raise ValueError("Unknown bleu_backend: " + str(self.options['bleu_backend']) + ". Possible values are 'python' and 'numpy'.")
+      if self.options['bleu_backend'] == 'numpy' and not numpy_enabled:
+        raise ValueError("bleu_backend 'numpy' requires numpy, which is not installed.")
+      if self.options['pathfinder'] not in ('sparse', 'dense'):
+        raise ValueError("Unknown pathfinder: " + str(self.options['pathfinder']) + ". Possible values are 'sparse' and 'dense'.")
+      if self.options['stream_window'] is not None:
+        if self.options['stream_window'] < 2:
+          raise ValueError('stream_window must be at least 2.')
+        if self.options['eval']:
+          raise ValueError('stream_window cannot be combined with eval, which needs whole articles.')
+      if self.options['shared_memory'] and not shared_memory_enabled:
+        raise ValueError('shared_memory requires multiprocessing.shared_memory (Python 3.8 or later).')
 
       self.src, self.close_src = \
             self._inputObjectFromParameter(self.options['srcfile'])
@@ -226,44 +564,71 @@ class Aligner:
       
       results = {}
 
-      if multiprocessing_enabled and self.options['num_processes'] > 1:
+      if self.options['stream_window']:
+        self.streamloop()
+
+      elif multiprocessing_enabled and self.options['num_processes'] > 1:
         tasks = multiprocessing.Queue(self.options['num_processes']+1)
 
-        manager = multiprocessing.Manager()
-        scores = manager.dict()
-        num_tasks = manager.Value('i',1)
-        scorers = [AlignMultiprocessed(tasks,self.options,scores,self.log)  for i in range(self.options['num_processes'])]
+        #results of the workers, as (task ID, result), in the order in which they are finished
+        finished = multiprocessing.Queue()
+        if self.options['shared_memory']:
+          shared.start_resource_tracker()
+          index = None
+        else:
+          index = self.article_index()
+        scorers = [AlignMultiprocessed(tasks,self.options,finished,self.log,index)  for i in range(self.options['num_processes'])]
 
         for p in scorers:
           p.start()
 
         #this function produces the alignment tasks for the consumers in scorers
-        producer = multiprocessing.Process(target=tasks_producer,args=(tasks,num_tasks,(self.src,self.srctotarget,self.target,self.targettosrc,self.options),self.options['num_processes']))
+        producer = multiprocessing.Process(target=tasks_producer,args=(tasks,finished,(self.src,self.srctotarget,self.target,self.targettosrc,self.options),self.options['num_processes'],index))
         producer.start()
 
         i = 0
-        #get results from processed and call printout function
-        while i < num_tasks.value:
-            
-            #wait till result #i is populated
-            while True:
+        num_tasks = None
+        pieces = []
+        #results that arrived before those of earlier tasks
+        waiting = {}
+        #get results in the order of the tasks and call printout function
+        while num_tasks is None or i < num_tasks:
+
+            #wait till result #i is available
+            if i not in waiting:
                 try:
-                    data,multialign,bleualign,scoredict = scores[i]
-                    break
-                except:
-                    time.sleep(0.1)
-                    for p in scorers:
+                    task_id, result = finished.get(True, 1)
+                except Empty:
+                    for p in scorers + [producer]:
                         if p.exitcode == 1:
                             for p in scorers:
                                 p.terminate()
                             producer.terminate()
                             raise RuntimeError("Multiprocessing error")
                     continue
+                if task_id is None:
+                    num_tasks = result
+                else:
+                    waiting[task_id] = result
+                continue
 
+            (article,k,num_pieces,piece),data,multialign,bleualign,scoredict = waiting.pop(i)
+            i += 1
+
+            #wait for all pieces of the article
+            pieces.append((piece,multialign,bleualign,scoredict))
+            if k < num_pieces-1:
+                continue
+            #with an index, articles are not sent back by the workers (see AlignMultiprocessed.run()); articles in shared memory
+            #are read from there, and the block is removed once the article is written
+            block = None
+            if data is None:
+                data = read_article(index,article,self.options)
+            elif isinstance(data,shared.SharedArticle if shared_memory_enabled else ()):
+                block,data = data.attach()
             (sourcelist,targetlist,translist1,translist2) = data
-            self.scoredict = scoredict
-            self.multialign = multialign
-            self.bleualign = bleualign
+            self.multialign,self.bleualign,self.scoredict = stitch_pieces(pieces,translist2)
+            pieces = []
 
             #normal case: translation from source to target exists
             if translist1:
@@ -279,17 +644,23 @@ class Aligner:
             self.printout(sourcelist, translist, targetlist)
 
             if self.options['eval']:
-                self.log('evaluation ' + str(i))
-                results[i] = evaluate(self.options,self.multialign,self.options['eval'][i],self.log)
-            
-            del(scores[i])
-            i += 1
+                self.log('evaluation ' + str(article))
+                results[article] = evaluate(self.options,self.multialign,self.options['eval'][article],self.log)
+
+            if block is not None:
+                block.close()
+                block.unlink()
 
       else:
-        for i,(sourcelist,targetlist,translist1,translist2) in enumerate(collect_article(self.src,self.srctotarget,self.target,self.targettosrc,self.options)):
+        for i,article in enumerate(collect_article(self.src,self.srctotarget,self.target,self.targettosrc,self.options)):
           self.log('reading in article ' + str(i) + ': ',1)
 
-          self.multialign = self.process(sourcelist,targetlist,translist1,translist2)
+          sourcelist,targetlist,translist1,translist2 = article
+          pieces = []
+          for piece in split_article(article,self.options):
+            multialign = self.process(sourcelist,targetlist,translist1,translist2,piece)
+            pieces.append((piece,multialign,self.bleualign,self.scoredict))
+          self.multialign,self.bleualign,self.scoredict = stitch_pieces(pieces,translist2)
           if translist1:
               translist = translist1[0]
           else:
@@ -310,13 +681,136 @@ class Aligner:
       if self.options['eval']:
         finalevaluation(results, self.log)
 
-      if self.options['filter']:
+      #with stream_window, streamloop() has filtered each window
+      if self.options['filter'] and not self.options['stream_window']:
         self.write_filtered()
 
       self.close_file_streams()
 
       return self.out1,self.out2
 
+    #an ArticleIndex of the input files, with which worker processes read their articles themselves (see bleualign.index).
+    #None if an input is not a file (but e.g. a list of strings), or cannot be indexed.
+    def article_index(self):
+      if not (self.close_src and self.close_target and all(self.close_srctotarget) and all(self.close_targettosrc)):
+        return None
+      try:
+        return ArticleIndex(self.options['srcfile'],self.options['srctotarget'],self.options['targetfile'],self.options['targettosrc'],
+                            self.options['end_of_article_marker'])
+      except ValueError as e:
+        self.log('input files cannot be indexed (' + str(e) + '); articles are read by a single process',1)
+        return None
+
+    #streaming version of mainloop(): keeps at most options['stream_window'] sentences of each text (and their translations) in memory.
+    #each time the window is full, it is aligned with process(), the stable part of the result is written out (see stream_cut()),
+    #and the window is refilled. At the end of an article (or of the input), all remaining alignments are written out.
+    def streamloop(self):
+
+      sources = read_lines(self.src,self.srctotarget,self.options)
+      targets = read_lines(self.target,self.targettosrc,self.options)
+
+      i = 0
+      while True:
+        self.log('reading in article ' + str(i) + ': ',1)
+        sourcelist,translist1 = [],[[] for f in self.srctotarget]
+        targetlist,translist2 = [],[[] for f in self.targettosrc]
+        source_end,target_end = None,None
+        #end of the last alignment that was written (see printout()), relative to the window
+        last = (0,0)
+
+        while True:
+          if not source_end:
+            source_end = self.fill_window(sources,sourcelist,translist1)
+          if not target_end:
+            target_end = self.fill_window(targets,targetlist,translist2)
+          final = source_end and target_end
+
+          if sourcelist and targetlist:
+            self.multialign = self.process(sourcelist,targetlist,translist1,translist2)
+          else:
+            self.multialign,self.bleualign = [],[]
+
+          if final:
+            src_cut,target_cut = len(sourcelist),len(targetlist)
+          else:
+            src_cut,target_cut = self.stream_cut(len(sourcelist),len(targetlist))
+          #the last alignment run is in the target-to-source direction if there are translations of the target text (see process())
+          cuts = (target_cut,src_cut) if translist2 else (src_cut,target_cut)
+          self.bleualign = [(k,j) for (k,j) in self.bleualign if k < cuts[0] and j < cuts[1]]
+
+          if translist1:
+            translist = translist1[0]
+          else:
+            if self.options['factored']:
+              translist = [item[0] for item in sourcelist]
+            else:
+              translist = sourcelist
+          #a window in which no alignment is kept would be written as an empty sentence pair
+          if self.multialign:
+            last = self.printout(sourcelist[:src_cut], translist[:src_cut], targetlist[:target_cut], last)
+            #sentence pairs are filtered for each window (instead of the whole text), so that they are not held until the end
+            if self.options['filter']:
+              self.write_filtered()
+              self.sources_out,self.targets_out,self.finalbleu = [],[],[]
+          elif not final:
+            #skipped sentences are unaligned, like those in a gap of the article
+            last = self.printout_unaligned(sourcelist, targetlist, last, (src_cut,target_cut))
+          last = (last[0]-src_cut, last[1]-target_cut)
+          if self.out1:
+            self.out1.flush()
+          if self.out2:
+            self.out2.flush()
+
+          del sourcelist[:src_cut]
+          del targetlist[:target_cut]
+          for t in translist1:
+            del t[:src_cut]
+          for t in translist2:
+            del t[:target_cut]
+
+          if final:
+            break
+
+        if source_end == 'file' and target_end == 'file':
+          break
+        i += 1
+
+
+    #move lines from a read_lines() generator to textlist (and translist) until the window is full.
+    #returns 'article' or 'file' if the end of the article or of the input is reached first, otherwise None.
+    def fill_window(self, lines, textlist, translist):
+      while len(textlist) < self.options['stream_window']:
+        item = next(lines, False)
+        if item is False:
+          return 'file'
+        if item is None:
+          return 'article'
+        line,translated = item
+        textlist.append(line)
+        for i,t in enumerate(translated):
+          translist[i].append(t)
+      return None
+
+
+    #decide which part of the alignment of a full window is written out. Alignments near the end of the window may change once more text
+    #is read, so we only keep those whose source sentences lie in the first half of the window, up to the last 1-to-1 alignment found by BLEU
+    #(or up to the last alignment if there is none). self.multialign is reduced to these alignments.
+    #returns the number of source and target sentences that are done with; if nothing is aligned in the first half, half of each text is skipped.
+    def stream_cut(self, num_sources, num_targets):
+      half = num_sources//2
+      candidates = [(pair,aligntype) for (pair,aligntype) in sorted(self.multialign,key=itemgetter(0)) if pair[0][-1] < half]
+
+      end = len(candidates)
+      for k,((src,target),aligntype) in enumerate(candidates):
+        if 'BLEU' in aligntype and len(src) == 1 and len(target) == 1:
+          end = k+1
+      self.multialign = candidates[:end]
+
+      if not self.multialign:
+        return half,num_targets//2
+      return self.multialign[-1][0][0][-1]+1, max(max(target) for ((src,target),aligntype) in self.multialign)+1
+
+
     #results of alignment or good aligment if filtering
     def results(self):
         return self.out1,self.out2
@@ -326,7 +820,9 @@ class Aligner:
         return self.out_bad1,self.out_bad2
 
     #Start different alignment runs depending on which and how many translations are sent to program; intersect results.
-    def process(self,sourcelist,targetlist,translist1,translist2):
+    #if piece (see split_article()) is given, only this part of the article is aligned, and the IDs in the result are relative to it.
+    #the sentences of the piece are still compared to the whole article, so that their best alternatives are the same as without pieces.
+    def process(self,sourcelist,targetlist,translist1,translist2,piece=None):
         
       multialign = []
         
@@ -347,17 +843,40 @@ class Aligner:
           raw_sourcelist = sourcelist
           raw_targetlist = targetlist
 
+      if piece is not None:
+        self.log('aligning source sentences ' + str(piece[0]) + ' to ' + str(piece[1]-1) + ' and target sentences ' + str(piece[2]) + ' to ' + str(piece[3]-1),1)
+        src_start,src_end,target_start,target_end = piece
+      else:
+        src_start,src_end,target_start,target_end = 0,len(sourcelist),0,len(targetlist)
+      translist1 = [translist[src_start:src_end] for translist in translist1]
+      translist2 = [translist[target_start:target_end] for translist in translist2]
+
+      #the target text is cooked once and shared by all translations into the target language (and vice versa),
+      #and by all pieces of the article that are aligned by this process
+      if piece is not None and self.cooked_article is not None and self.cooked_article[0] is sourcelist and self.cooked_article[1] is targetlist:
+        cooked_targets, cooked_sources = self.cooked_article[2:]
+      else:
+        #the tokens of the last article are not needed anymore
+        bleu.normalize_memo.clear()
+        bleu.normalize_memo_size = self.options['normalize_memo_size']
+        cooked_targets, cooked_sources = None, None
+        if translist1 and not self.options['galechurch']:
+          cooked_targets = self.cook_sents(raw_targetlist)
+        if translist2 and not self.options['galechurch']:
+          cooked_sources = self.cook_sents(raw_sourcelist)
+        self.cooked_article = (sourcelist, targetlist, cooked_targets, cooked_sources)
+
       for i,translist in enumerate(translist1):
         self.log("computing alignment between srctotarget (file " + str(i) + ") and target text",1)
-        phase1.append(self.align(translist, raw_targetlist))
+        phase1.append(self.align(translist, raw_targetlist, cooked_targets, (target_start,target_end)))
 
       for i,translist in enumerate(translist2):
         self.log("computing alignment between targettosrc (file " + str(i) + ") and source text",1)
-        phase2.append(self.align(translist, raw_sourcelist))
+        phase2.append(self.align(translist, raw_sourcelist, cooked_sources, (src_start,src_end)))
 
       if not (translist1 or translist2):
         if self.options['no_translation_override'] or self.options['galechurch']:
-            phase1 = [self.align(raw_sourcelist, raw_targetlist)]
+            phase1 = [self.align(raw_sourcelist[src_start:src_end], raw_targetlist, None, (target_start,target_end))]
         else:
             self.log("ERROR: no translation available", 1)
             if multiprocessing_enabled and self.options['num_processes'] > 1:
@@ -380,10 +899,12 @@ class Aligner:
       if phase1 and phase2:
         self.log("intersecting both directions",1)
         phase3 = []
-        phase2mirror = [(j,k) for ((k,j),t) in phase2]
+        phase2mirror = {}
+        for (k,j),t in phase2:
+          phase2mirror.setdefault((j,k),t)
         for pair,t in phase1:
           if pair in phase2mirror:
-            phase3.append((pair,'INTERSECT: ' + t + ' - ' + phase2[phase2mirror.index(pair)][1]))
+            phase3.append((pair,'INTERSECT: ' + t + ' - ' + phase2mirror[pair]))
         multialign = phase3
         
       elif phase1:
@@ -392,14 +913,27 @@ class Aligner:
       elif phase2:
         multialign = [((j,k),t) for ((k,j),t) in phase2]
 
+      #write the sentences that were added to (or used from) the persistent cache in one transaction
+      if self.cook_cache is not None:
+        self.cook_cache.flush()
+
       return multialign
 
 
     #Compute alignment for one article and one automatic translation.
-    def align(self, translist, targetlist):
+    #cooked_targets (see cook_sents()) may be passed if targetlist has already been cooked.
+    #if window = (first, end) is given, translist is only aligned to targetlist[first:end], but its sentences are still scored against
+    #all of targetlist, so that they have the same alternatives as in an alignment with the whole target text.
+    def align(self, translist, targetlist, cooked_targets=None, window=None):
+
+      if window is not None and window != (0, len(targetlist)):
+        alltargets = targetlist
+        targetlist = targetlist[window[0]:window[1]]
+      else:
+        alltargets = None
 
       if self.options["galechurch"]:
-        self.multialign,self.bleualign,self.scoredict = [],[],{}
+        self.multialign,self.bleualign,self.scoredict = Alignments(),[],{}
         translist = [item for item in enumerate(translist)]
         targetlist =  [item for item in enumerate(targetlist)]
         churchaligns = self.gale_church(translist,targetlist)
@@ -408,20 +942,87 @@ class Aligner:
         return self.multialign
 
       else:
-        self.log('Evaluating sentences with bleu',1)
-        self.scoredict = self.eval_sents(translist,targetlist)
-        self.log('finished',1)
-        self.log('searching for longest path of good alignments',1)
-        self.pathfinder(translist, targetlist)
-        self.log('finished',1)
+        band = self.band_width(len(translist), len(targetlist)) if alltargets is None else None
+        #scores of sentence pairs of this article that are reused in gapfiller() (see eval_sents()). Target IDs are those of alltargets.
+        self.score_cache, self.score_cache_offset = {}, window[0] if alltargets is not None else 0
+        self.score_cache_hits, self.score_cache_misses = 0, 0
+        while True:
+          self.log('Evaluating sentences with bleu',1)
+          if alltargets is None:
+            self.scoredict = self.eval_sents(translist,targetlist,band,cooked_targets,score_cache=self.score_cache)
+          else:
+            self.scoredict = self.window_scores(self.eval_sents(translist,alltargets,None,cooked_targets,score_cache=self.score_cache), window)
+          self.log('finished',1)
+          #the numpy backend scores all pairs, without pruning
+          if self.options['bleu_backend'] == 'python':
+            self.log('skipped ' + str(self.pruned_pairs) + ' out of ' + str(self.candidate_pairs) + ' candidate sentence pairs whose score bound is too low',1)
+          self.log('searching for longest path of good alignments',1)
+          self.pathfinder(translist, targetlist, band)
+          self.log('finished',1)
+          if band is None or not self.band_too_narrow(len(translist), len(targetlist), band):
+            break
+          band *= 2
+          if band >= len(targetlist):
+            band = None
+          self.log('best path or candidates touch edge of band; widening band to ' + str(band),1)
         self.log(time.asctime(),2)
         self.log('filling gaps',1)
         self.gapfinder(translist, targetlist)
         self.log('finished',1)
+        if self.score_cache_hits + self.score_cache_misses:
+          self.log('reused first-pass scores for ' + str(self.score_cache_hits) + ' out of ' + str(self.score_cache_hits + self.score_cache_misses)
+                   + ' pairs of single sentences in gaps (' + str(100*self.score_cache_hits/float(self.score_cache_hits + self.score_cache_misses)) + '%)',2)
+        self.score_cache = None
         self.log(time.asctime(),2)
         return self.multialign
 
 
+    #keep the alternatives in scoredict whose target is in window = (first, end), with IDs relative to the window
+    def window_scores(self, scoredict, window):
+      first, end = window
+      return dict([(testID, [(score, target-first, correct) for (score, target, correct) in alternatives if first <= target < end])
+                   for testID, alternatives in scoredict.items()])
+
+
+    #translate the 'band_width' option (or another option with the same values) into an absolute distance from the diagonal (or None for no band)
+    def band_width(self, num_tests, num_targets, option='band_width'):
+      band = self.options[option]
+      if not band:
+        return None
+      if isinstance(band, float) and band < 1:
+        band = band*num_targets
+      band = max(1, int(math.ceil(band)))
+      if band >= num_targets:
+        return None
+      return band
+
+
+    #first and last target ID that each test sentence is compared to.
+    #the band is centered on the length-proportional diagonal, so both bounds never decrease from one test sentence to the next.
+    def band_bounds(self, num_tests, num_targets, band):
+      if band is None:
+        return [(0, num_targets-1)]*num_tests
+      bounds = []
+      for i in range(num_tests):
+        center = i*num_targets/num_tests
+        bounds.append((max(0, int(math.ceil(center-band))), min(num_targets-1, int(math.floor(center+band)))))
+      return bounds
+
+
+    #check if the band may be too narrow: if the best path of 1-to-1 alignments touches its edge, or the best candidate of a test sentence lies on it,
+    #better candidates (which would also push weak ones out of the top maxalternatives) may lie outside of the band
+    def band_too_narrow(self, num_tests, num_targets, band):
+      bounds = self.band_bounds(num_tests, num_targets, band)
+      edge = lambda i,j: (j == bounds[i][0] and j > 0) or (j == bounds[i][1] and j < num_targets-1)
+      for i,j in self.bleualign:
+        if edge(i,j):
+          return True
+      for i,alternatives in self.scoredict.items():
+        if alternatives and edge(i,alternatives[0][1]):
+          return True
+      return False
+
+
    #use this if you want to implement your own similarity score
     def eval_sents_dummy(self,translist,targetlist):
       scoredict = {}
@@ -440,52 +1041,106 @@ class Aligner:
 
     # given list of test sentences and list of reference sentences, calculate bleu scores
     #if you want to replace bleu with your own similarity measure, use eval_sents_dummy
-    def eval_sents(self,translist,targetlist):
-      
+    #if band is given, only target sentences within this distance of the diagonal are considered.
+    #alternatively, bounds may give the first and last target ID that each test sentence is compared to.
+    #cooked_targets is the result of cook_sents(targetlist); it is computed if not given.
+    #cooked_tests is a list of (length, counts) of the test sentences, with n-grams from cooked_targets.vocab; it is computed if not given
+    #score_cache is a dictionary of (meanscore, correct), or None for pairs without match, by (test key, target key). Scores are looked up there,
+    #and with the Python backend, the first pass stores the scores of targets within score_cache_distance of the best alternatives of each test sentence.
+    #the keys of test and target sentences (test_keys and ref_keys) are their IDs by default; None means that a sentence is not cached.
+    def eval_sents(self,translist,targetlist,band=None,cooked_targets=None,cooked_tests=None,bounds=None,score_cache=None,test_keys=None,ref_keys=None):
+
+      restricted = band is not None or bounds is not None
+      if bounds is None:
+        bounds = self.band_bounds(len(translist), len(targetlist), band)
+      self.candidate_pairs, self.pruned_pairs = 0, 0
+      if cooked_targets is None:
+        cooked_targets = self.cook_sents(targetlist)
+      if cooked_tests is None:
+        cooked_tests = self.cook_tests(translist, cooked_targets.vocab)
+
+      if self.options['bleu_backend'] == 'numpy':
+        return vectorized.eval_sents(cooked_tests, cooked_targets,
+                                     self.options['bleu_ngrams'], self.options['maxalternatives'], bounds)
+
       scoredict = {}
       cooked_test = {}
-      cooked_test2 = {}
       ngrams = self.options['bleu_ngrams']
-      charlevel = self.options['bleu_charlevel']
-
-      cooktarget_cache = {}
-      cooktarget = []
-      for idx, item in enumerate(targetlist):
-        if charlevel:
-            item = tuple(item)
-        if item in cooktarget_cache:
-          cooktarget.append((idx, cooktarget_cache[item]))
-        else:
-          cooked = (idx, bleu.cook_ref_set(item, ngrams))
-          cooktarget.append(cooked)
-          cooktarget_cache[item] = cooked[1]
+      maxalternatives = self.options['maxalternatives']
 
-      for testID,testSent in enumerate(translist):
+      #n-grams are mapped to integers, which are faster to hash and compare than tuples of strings
+      vocab = cooked_targets.vocab
+      cooktarget = cooked_targets.cooked
+
+      #inverted index from highest-order n-grams to target IDs.
+      #a test sentence is only compared to targets that share at least one highest-order n-gram with it; all others would get a score of 0 anyway
+      ngram_index = cooked_targets.index
 
-        if charlevel:
-            testSent = tuple(testSent)
+      for testID,test in enumerate(cooked_tests):
 
         #copied over from bleu.py to minimize redundancy
-        test_normalized = bleu.normalize(testSent)
-        cooked_test["testlen"] = len(test_normalized)
-        cooked_test["guess"] = [max(len(test_normalized)-k+1,0) for k in range(1,self.options['bleu_ngrams']+1)]
-        counts = bleu.count_ngrams(test_normalized, self.options['bleu_ngrams'])
+        cooked_test["testlen"] = test[0]
+        counts = test[1]
+
+        testkey = None
+        if score_cache is not None:
+          testkey = test_keys[testID] if test_keys is not None else testID
+        computed = []
         
         #separate by n-gram length. if we have no matching bigrams, we don't have to compare unigrams
         ngrams_sorted = dict([(x,set()) for x in range(self.options['bleu_ngrams'])])
         for ngram in counts:
-            ngrams_sorted[len(ngram)-1].add(ngram)
+            ngrams_sorted[vocab.order[ngram]].add(ngram)
             
 
-        scorelist = []
+        #the lists of target IDs in the index are sorted, so those within the bounds can be found by bisection
+        candidates = set()
+        lo, hi = bounds[testID]
+        for ngram in ngrams_sorted[self.options['bleu_ngrams']-1]:
+          postings = ngram_index.get(ngram,())
+          if restricted:
+            postings = postings[bisect_left(postings,lo):bisect_right(postings,hi)]
+          candidates.update(postings)
+        self.candidate_pairs += len(candidates)
+
+        #min-heap with the best maxalternatives candidates so far, as (score, -refID, correct).
+        #ties are won by the lower refID, as in a stable sort
+        topk = []
         scorelist_cache = {}
-        for (refID,(reflen, refmaxcounts, refset)) in cooktarget:
+        bound_cache = {}
+        for refID in sorted(candidates):
+          reflen, refmaxcounts, refset = cooktarget[refID]
+
+          #skip the n-gram comparison if no target of this length can make it into the top candidates
+          if len(topk) >= maxalternatives:
+            if reflen not in bound_cache:
+              bound_cache[reflen] = self.bleu_upper_bound(cooked_test["testlen"], reflen)
+            if not maxalternatives or bound_cache[reflen]*(1+1e-9) <= topk[0][0]:
+              self.pruned_pairs += 1
+              continue
+
           if refset in scorelist_cache:
             if scorelist_cache[refset] is not None:
               m, c = scorelist_cache[refset]
-              scorelist.append((m, refID, c))
+              self.push_candidate(topk, (m, -refID, c))
             continue
 
+          refkey = None
+          if testkey is not None:
+            refkey = ref_keys[refID] if ref_keys is not None else refID
+          if refkey is not None:
+            cached = score_cache.get((testkey,refkey), False)
+            if test_keys is not None:
+              if cached is False:
+                self.score_cache_misses += 1
+              else:
+                self.score_cache_hits += 1
+            if cached is not False:
+              if cached is not None:
+                self.push_candidate(topk, (cached[0], -refID, cached[1]))
+              scorelist_cache[refset] = cached
+              continue
+
           ngrams_filtered = ngrams_sorted[self.options['bleu_ngrams']-1].intersection(refset)
         
           if ngrams_filtered:
@@ -498,52 +1153,125 @@ class Aligner:
                 for ngram in ngrams_sorted[order].intersection(refset):
                     cooked_test["correct"][order] += min(refmaxcounts[ngram], counts[ngram])
 
-            #copied over from bleu.py to minimize redundancy
-            logbleu = 0.0
-            for k in range(self.options['bleu_ngrams']):
-                logbleu += math.log(cooked_test['correct'][k])-math.log(cooked_test['guess'][k])
-            logbleu /= self.options['bleu_ngrams']
-            logbleu += min(0,1-float(cooked_test['reflen'])/cooked_test['testlen'])
-            score = math.exp(logbleu)
-            
-            if score > 0:
-                #calculate bleu score in reverse direction
-                cooked_test2["guess"] = [max(cooked_test['reflen']-k+1,0) for k in range(1,self.options['bleu_ngrams']+1)]
-                logbleu = 0.0
-                for k in range(self.options['bleu_ngrams']):
-                    logbleu += math.log(cooked_test['correct'][k])-math.log(cooked_test2['guess'][k])
-                logbleu /= self.options['bleu_ngrams']
-                logbleu += min(0,1-float(cooked_test['testlen'])/cooked_test['reflen'])
-                score2 = math.exp(logbleu)
-                
-                meanscore = (2*score*score2)/(score+score2)
-                scorelist.append((meanscore,refID,cooked_test['correct']))
+            meanscore = self.bidirectional_bleu(cooked_test['correct'], cooked_test['testlen'], cooked_test['reflen'])
+            if meanscore is not None:
+                self.push_candidate(topk, (meanscore, -refID, cooked_test['correct']))
                 scorelist_cache[refset] = (meanscore, cooked_test['correct'])
             else:
                 scorelist_cache[refset] = None
-        else:
-            scorelist_cache[refset] = None
-              
-        scoredict[testID] = sorted(scorelist,key=itemgetter(0),reverse=True)[:self.options['maxalternatives']]
+            if refkey is not None:
+                computed.append((refkey, scorelist_cache[refset]))
+
+        scoredict[testID] = [(m, -negrefID, c) for (m, negrefID, c) in sorted(topk, reverse=True)]
+
+        #in the first pass, keep the scores of targets close to the best alternatives
+        if computed and test_keys is None:
+          best = [-negrefID for (m, negrefID, c) in topk]
+          for refkey, cached in computed:
+            for refID in best:
+              if abs(refkey - refID) <= score_cache_distance:
+                score_cache[(testkey,refkey)] = cached
+                break
         
       return scoredict
 
 
+    #normalize and cook sentences that will be compared to test sentences in eval_sents()
+    def cook_sents(self, sentences):
+      return bleu.CookedSentences(self.normalize_sents(sentences), self.options['bleu_ngrams'])
+
+
+    #normalize test sentences and count their n-grams, for comparison with sentences cooked with vocab
+    def cook_tests(self, sentences, vocab):
+      ngrams = self.options['bleu_ngrams']
+      return [(len(words), vocab.count_ngrams(words, ngrams)) for words in self.normalize_sents(sentences)]
+
+
+    #normalize and tokenize sentences for BLEU, using the persistent cache if there is one (and persistent is true).
+    #the cache is only worth its lookups for whole articles; sentences that are normalized again later (e.g. in score_gaps()) are in the memo of bleu.normalize(),
+    #where TokenCache also puts the sentences it finds.
+    def normalize_sents(self, sentences, persistent=True):
+      if persistent and self.options['cook_cache']:
+        if self.cook_cache is None:
+          self.cook_cache = TokenCache(self.options['cook_cache'], self.options['cook_cache_size'])
+        return self.cook_cache.normalize(sentences, self.options['bleu_charlevel'])
+      if self.options['bleu_charlevel']:
+        return [bleu.normalize(tuple(sentence)) for sentence in sentences]
+      return [bleu.normalize(sentence) for sentence in sentences]
+
+
+    #harmonic mean of the BLEU scores in both directions, given the number of matching n-grams of each order.
+    #returns None if there is no match
+    def bidirectional_bleu(self, correct, testlen, reflen):
+
+      #copied over from bleu.py to minimize redundancy
+      logbleu = 0.0
+      for k in range(self.options['bleu_ngrams']):
+          logbleu += math.log(correct[k])-math.log(max(testlen-k,0))
+      logbleu /= self.options['bleu_ngrams']
+      logbleu += min(0,1-float(reflen)/testlen)
+      score = math.exp(logbleu)
+
+      if not score > 0:
+          return None
+
+      #calculate bleu score in reverse direction
+      logbleu = 0.0
+      for k in range(self.options['bleu_ngrams']):
+          logbleu += math.log(correct[k])-math.log(max(reflen-k,0))
+      logbleu /= self.options['bleu_ngrams']
+      logbleu += min(0,1-float(testlen)/reflen)
+      score2 = math.exp(logbleu)
+
+      return (2*score*score2)/(score+score2)
+
+
+    #highest score that a pair of sentences with these lengths can get: at most all n-grams of the shorter sentence match.
+    #used to skip sentence pairs that cannot make it into the top maxalternatives.
+    def bleu_upper_bound(self, testlen, reflen):
+      correct = [max(min(testlen,reflen)-k,0) for k in range(self.options['bleu_ngrams'])]
+      if not correct[-1]:
+        return 0
+      return self.bidirectional_bleu(correct, testlen, reflen) or 0
+
+
+    #add candidate to min-heap of best maxalternatives candidates
+    def push_candidate(self, topk, candidate):
+      if len(topk) < self.options['maxalternatives']:
+        heapq.heappush(topk, candidate)
+      elif candidate > topk[0]:
+        heapq.heapreplace(topk, candidate)
+
+
     #follow the backpointers in score matrix to extract best path of 1-to-1 alignments
-    def extract_best_path(self,pointers):
+    #pointers only cover the band of each row (see pathfinder()); rowmax is the score of the last cell in the band of each row
+    def extract_best_path(self,pointers,bounds,rowmax,num_targets):
 
         i = len(pointers)-1
-        j = len(pointers[0])-1
+        j = num_targets-1
         pointer = ''
         best_path = []
 
         while i >= 0 and j >= 0:
-            pointer = pointers[i][j]
-            if pointer == '^':
+            lo, hi = bounds[i]
+            #left of the band, the best score is always the one from the row above
+            if j < lo:
                 i -= 1
-            elif pointer == '<':
+                continue
+            #right of the band, we move left if the current row improved on the previous one
+            elif j > hi:
+                if i > 0 and rowmax[i] > rowmax[i-1] or i == 0 and rowmax[i] > 0:
+                    j = hi
+                else:
+                    i -= 1
+                continue
+
+            pointer = pointers[i][j-lo]
+            if pointer == UP:
+                i -= 1
+            elif pointer == LEFT:
                 j -= 1
-            elif pointer == 'match':
+            elif pointer == MATCH:
                 best_path.append((i,j))
                 i -= 1
                 j -= 1
@@ -552,153 +1280,323 @@ class Aligner:
         return best_path
 
 
+    #search for best path of alignments (maximal score), with the algorithm chosen by the 'pathfinder' option
+    def pathfinder(self, translist, targetlist, band=None):
+        if self.options['pathfinder'] == 'dense':
+            cells = sum([hi-lo+1 for (lo, hi) in self.band_bounds(len(translist), len(targetlist), band)])
+            if cells > self.options['dense_max_cells']:
+                self.log('score matrix has ' + str(cells) + ' cells; searching in linear memory',2)
+                self.pathfinder_linear(translist, targetlist)
+            else:
+                self.pathfinder_dense(translist, targetlist, band)
+        else:
+            self.pathfinder_sparse(translist, targetlist)
+
+
+    #best path of alignments as a weighted longest increasing chain of the candidate pairs in scoredict (see best_chain()).
+    #time is O(K*n*log(m)) and memory O(K*n) for n test sentences, m target sentences and K = maxalternatives.
+    def pathfinder_sparse(self, translist, targetlist):
+        self.bleualign = best_chain(self.scoredict, len(translist), len(targetlist))
+
+
     #dynamic programming search for best path of alignments (maximal score)
-    def pathfinder(self, translist, targetlist):
+    #if band is given, only cells within this distance of the diagonal are computed.
+    #this gives the same result as a full search, since scoredict has no alignments outside of the band.
+    #backpointers are stored as one signed char per cell, and only two rows of scores are kept.
+    def pathfinder_dense(self, translist, targetlist, band=None):
+
+        bounds = self.band_bounds(len(translist), len(targetlist), band)
+
+        if numpy_enabled:
+            pointers, rowmax = vectorized.pathfinder_dense(self.scoredict, bounds, len(targetlist))
+            self.bleualign = self.extract_best_path(pointers, bounds, rowmax, len(targetlist))
+            return
 
-        # add an extra row/column to the matrix and start filling it from 1,1 (to avoid exceptions for first row/column)
-        matrix = [[0 for column in range(len(targetlist)+1)] for row in range(len(translist)+1)]
-        pointers = [['' for column in range(len(targetlist))] for row in range(len(translist))]
+        pointers = []
+        rowmax = array('d')
+
+        #scores of cells left of the band; they are the same for all following rows.
+        frozen = array('d', [0])*len(targetlist)
+        previous, previous_lo, previous_hi = array('d'), 0, -1
 
         for i in range(len(translist)):
-            alignments = dict([(target, score) for (score, target, correct) in self.scoredict[i]])
+            lo, hi = bounds[i]
 
-            for j in range(len(targetlist)):
+            #previous row up to column hi (columns right of its band have the score of the last cell in the band)
+            extended = previous + array('d', [previous[-1] if previous else 0])*max(0, hi-previous_hi)
+            frozen[previous_lo:lo] = extended[:lo-previous_lo]
 
-                best_score = matrix[i][j+1]
-                best_pointer = '^'
+            #columns lo-1 to hi of the previous row (columns left of its band are frozen)
+            if lo > 0:
+                above = frozen[lo-1:min(hi+1, previous_lo)]
+            else:
+                above = array('d', [0])
+            above += extended[max(lo-1, previous_lo)-previous_lo:hi+1-previous_lo]
+
+            row, row_pointers = self.dense_row(i, above, frozen[lo-1] if lo > 0 else 0, lo, hi)
+
+            pointers.append(row_pointers)
+            rowmax.append(row[-1])
+            previous, previous_lo, previous_hi = row[1:], lo, hi
+
+        self.bleualign = self.extract_best_path(pointers, bounds, rowmax, len(targetlist))
+
+
+    #one row of the dense score matrix (see pathfinder_dense()) from column c0-1 (which has the score left) to c1,
+    #given the same columns of the row above. Also returns the backpointers (UP, LEFT or MATCH) of columns c0 to c1.
+    #each cell is the best of the cell above, the cell to the left and a match, so the row is a running maximum;
+    #matches are only looked at in the columns that have one.
+    def dense_row(self, i, above, left, c0, c1):
+        up = above[1:]
+        best = array('d', up)
+        matches = {}
+        for (score, target, correct) in self.scoredict[i]:
+            if c0 <= target <= c1:
+                matches[target-c0] = score + above[target-c0]
+        for k, score in matches.items():
+            if score > best[k]:
+                best[k] = score
+
+        row = array('d', [left])
+        row_pointers = array('b', [UP])*len(up)
+        for k in range(len(up)):
+            if left > up[k]:
+                row_pointers[k] = LEFT
+            if best[k] > left:
+                left = best[k]
+            row.append(left)
+
+        for k, score in matches.items():
+            if score > up[k] and score > row[k]:
+                row_pointers[k] = MATCH
+
+        return row, row_pointers
+
+
+    #same path as pathfinder_dense() (without a band, which makes no difference), but in O(n+m) memory instead of keeping all backpointers.
+    #Hirschberg-style divide and conquer: for a region of the score matrix, we compute its rows once to find the column where the best path
+    #crosses the middle row, and then solve the two smaller regions on either side of this point. Their boundary scores (the row above
+    #and the column to the left of each region) are kept so that the scores are exactly those of the full matrix.
+    def pathfinder_linear(self, translist, targetlist):
 
-                score = matrix[i+1][j]
-                if score > best_score:
-                    best_score = score
-                    best_pointer = '<'
+        best_path = []
+        #regions as (first row, last row, first column, last column, scores of row above from column c0-1, scores of column left of region).
+        #the best path enters each region at its bottom right cell. the region on top is kept for later, so columns of waiting regions do not overlap.
+        regions = []
+        if translist and targetlist:
+            regions.append((0, len(translist)-1, 0, len(targetlist)-1, array('d', [0])*(len(targetlist)+1), array('d', [0])*len(translist)))
+
+        while regions:
+            r0, r1, c0, c1, top, left = regions.pop()
+
+            #small region: keep the backpointers and follow them until the path leaves the region
+            if r0 == r1 or (r1-r0+1)*(c1-c0+1) <= linear_block_cells:
+                pointers = []
+                row = top
+                for i in range(r0, r1+1):
+                    row, row_pointers = self.dense_row(i, row, left[i-r0], c0, c1)
+                    pointers.append(row_pointers)
+                i, j = r1, c1
+                while i >= r0 and j >= c0:
+                    pointer = pointers[i-r0][j-c0]
+                    if pointer == UP:
+                        i -= 1
+                    elif pointer == LEFT:
+                        j -= 1
+                    elif pointer == MATCH:
+                        best_path.append((i,j))
+                        i -= 1
+                        j -= 1
+                continue
 
-                if j in alignments:
-                    score = alignments[j] + matrix[i][j]
+            mid = (r0+r1)//2
+            row = top
+            for i in range(r0, mid+1):
+                row, row_pointers = self.dense_row(i, row, left[i-r0], c0, c1)
+            middle = row
+
+            #below the middle row, follow each cell's path back to the column where it reaches the middle row (None if it leaves the region on the left)
+            exits = [None] + list(range(c0, c1+1))
+            for i in range(mid+1, r1+1):
+                row, row_pointers = self.dense_row(i, row, left[i-r0], c0, c1)
+                row_exits = [None]
+                for k, pointer in enumerate(row_pointers):
+                    if pointer == UP:
+                        row_exits.append(exits[k+1])
+                    elif pointer == LEFT:
+                        row_exits.append(row_exits[k])
+                    else:
+                        row_exits.append(exits[k])
+                exits = row_exits
+            crossing = exits[-1]
+
+            if crossing is None:
+                regions.append((mid+1, r1, c0, c1, middle, left[mid+1-r0:]))
+                continue
 
-                    if score > best_score:
-                        best_score = score
-                        best_pointer = 'match'
+            #scores left of the lower region: recompute the rows below the middle up to that column
+            lower_left = array('d')
+            row = middle[:crossing-c0+1]
+            for i in range(mid+1, r1+1):
+                if crossing > c0:
+                    row, row_pointers = self.dense_row(i, row, left[i-r0], c0, crossing-1)
+                    lower_left.append(row[-1])
+                else:
+                    lower_left.append(left[i-r0])
 
-                matrix[i+1][j+1] = best_score
-                pointers[i][j] = best_pointer
+            regions.append((r0, mid, c0, crossing, top[:crossing-c0+2], left[:mid-r0+1]))
+            regions.append((mid+1, r1, crossing, c1, middle[crossing-c0:], lower_left))
 
-        self.bleualign = self.extract_best_path(pointers)
+        best_path.reverse()
+        self.bleualign = best_path
 
 
     #find unaligned sentences and create work packets for gapfiller()
     #gapfiller() takes two sentence pairs and all unaligned sentences in between as arguments; gapfinder() extracts these.
     def gapfinder(self, translist, targetlist):
       
-      self.multialign = []
-      
+      self.multialign = Alignments(self.bleualign)
+
+      #gaps lie between the 1-to-1 alignments of the first BLEU pass. Their candidates are scored in batches of up to gap_batch_size gaps
+      #(see score_gaps()), assuming that each gap starts right after the previous alignment. gapfiller() may extend that alignment,
+      #which changes the next gap; such gaps are scored again on their own.
+      postgaps = [((src,),(target,)) for src,target in self.bleualign] + [((),())]
+      pregaps = [((),())] + postgaps[:-1]
+      scoredicts = {}
+      use_bleu = self.options['Nto1'] > 1 or "bleu1to1" in self.options['gapfillheuristics']
+
       #find gaps: lastpair is considered pre-gap, pair is post-gap
       lastpair = ((),())
-      src, target = None, None
-      for src,target in self.bleualign:
-
-        oldsrc, oldtarget = lastpair
-        #in first iteration, gap will start at 0
-        if not oldsrc:
-            oldsrc = (-1,)
-        if not oldtarget:
-            oldtarget = (-1,)
+      for k,pair in enumerate(postgaps):
 
-        #identify gap sizes
-        sourcegap = list(range(oldsrc[-1]+1,src))
-        targetgap = list(range(oldtarget[-1]+1,target))
+        sourcegap,targetgap = self.find_gap(lastpair, pair, translist, targetlist)
 
         if targetgap or sourcegap:
-          lastpair = self.gapfiller(sourcegap, targetgap, lastpair, ((src,),(target,)), translist, targetlist)
+          scoredict = None
+          if use_bleu and lastpair == pregaps[k]:
+            if k not in scoredicts:
+              batch = []
+              for l in range(k, len(postgaps)):
+                if len(batch) == gap_batch_size[self.options['bleu_backend']]:
+                  break
+                if any(self.find_gap(pregaps[l], postgaps[l], translist, targetlist)):
+                  batch.append(l)
+              gaps = [self.find_gap(pregaps[l], postgaps[l], translist, targetlist) + (pregaps[l], postgaps[l]) for l in batch]
+              scoredicts = dict(zip(batch, self.score_gaps(gaps, translist, targetlist)))
+            scoredict = scoredicts[k]
+          lastpair = self.gapfiller(deque(sourcegap), deque(targetgap), lastpair, pair, translist, targetlist, scoredict)
         else:
           self.addtoAlignments(lastpair)
-          lastpair = ((src,),(target,))
-
-      #if self.bleualign is empty, gap will start at 0
-      if src is None:
-          src = -1
-      if target is None:
-          target = -1
-
-      #search for gap after last alignment pair
-      sourcegap = list(range(src+1, len(translist)))
-      targetgap = list(range(target+1, len(targetlist)))
-
-      if targetgap or sourcegap:
-        lastpair = self.gapfiller(sourcegap, targetgap, lastpair, ((),()), translist, targetlist)
+          lastpair = pair
       
       self.addtoAlignments(lastpair)
 
 
-    #apply heuristics to align all sentences that remain unaligned after finding best path of 1-to-1 alignments
-    #heuristics include bleu-based 1-to-n alignment and length-based alignment
-    def gapfiller(self, sourcegap, targetgap, pregap, postgap, translist, targetlist):
+    #the source and target sentences between two alignment pairs; ((),()) stands for the start or the end of the article
+    def find_gap(self, pregap, postgap, translist, targetlist):
 
-      evalsrc = []
-      evaltarget = []
+      #in first iteration, gap will start at 0
+      oldsrc = pregap[0] or (-1,)
+      oldtarget = pregap[1] or (-1,)
 
-      #compile list of sentences in gap that will be considered for BLEU comparison
-      if self.options['Nto1'] > 1 or "bleu1to1" in self.options['gapfillheuristics']:
+      #after last alignment pair, gap will end with the article
+      src = postgap[0][0] if postgap[0] else len(translist)
+      target = postgap[1][0] if postgap[1] else len(targetlist)
 
-        #concatenate all sentences in pregap alignment pair
-        tmpstr =  ' '.join([translist[i] for i in pregap[0]])
-        evalsrc.append((pregap[0],tmpstr))
+      return range(oldsrc[-1]+1,src), range(oldtarget[-1]+1,target)
 
-        #concatenate all sentences in pregap alignment pair
-        tmpstr =  ' '.join([targetlist[i] for i in pregap[1]])
-        evaltarget.append((pregap[1],tmpstr))
-        
-        #search will be pruned to this window
-        if "bleu1to1" in self.options['gapfillheuristics']:
-          window = 10 + self.options['Nto1']
-        else:
-          window = self.options['Nto1']
-        
-        for src in [j for i,j in enumerate(sourcegap) if (i < window or len(sourcegap)-i <= window)]:
-          Sent = translist[src]
-          evalsrc.append(((src,),Sent))
-        
-        for target in [j for i,j in enumerate(targetgap) if (i < window or len(targetgap)-i <= window)]:
-          Sent = targetlist[target]
-          evaltarget.append(((target,),Sent))
-        
-        #concatenate all sentences in postgap alignment pair
-        tmpstr =  ' '.join([translist[i] for i in postgap[0]])
-        evalsrc.append((postgap[0],tmpstr))
-        
-        #concatenate all sentences in postgap alignment pair
-        tmpstr =  ' '.join([targetlist[i] for i in postgap[1]])
-        evaltarget.append((postgap[1],tmpstr))
 
+    #BLEU scores of the sentences and concatenations of sentences that gapfiller() considers for a list of gaps, given as
+    #(sourcegap, targetgap, pregap, postgap). All gaps are scored with one call of eval_sents(); the candidates of each gap are only
+    #compared to the target candidates of the same gap. Returns a scoredict for each gap, with tuples of sentence IDs instead of sentence IDs.
+    def score_gaps(self, gaps, translist, targetlist):
 
-        nSrc = {}
+      #search will be pruned to this window
+      if "bleu1to1" in self.options['gapfillheuristics']:
+        window = 10 + self.options['Nto1']
+      else:
+        window = self.options['Nto1']
+
+      pruned = []
+      srcIDs, targetIDs = set(), set()
+      for sourcegap,targetgap,pregap,postgap in gaps:
+        sourcegap = [j for i,j in enumerate(sourcegap) if (i < window or len(sourcegap)-i <= window)]
+        targetgap = [j for i,j in enumerate(targetgap) if (i < window or len(targetgap)-i <= window)]
+        pruned.append((sourcegap,targetgap,pregap,postgap))
+        srcIDs.update(pregap[0] + tuple(sourcegap) + postgap[0])
+        targetIDs.update(pregap[1] + tuple(targetgap) + postgap[1])
+
+      #each sentence is normalized and counted once, even if it borders on two gaps; concatenations are cooked from their parts (see bleu.NgramVocabulary.concatenate())
+      ngrams = self.options['bleu_ngrams']
+      vocab = bleu.NgramVocabulary()
+      concatenate = lambda first, second: vocab.concatenate(first, second, ngrams)
+      srcIDs, targetIDs = sorted(srcIDs), sorted(targetIDs)
+      srcparts = dict(zip(srcIDs, [vocab.cook_part(words, ngrams) for words in self.normalize_sents([translist[i] for i in srcIDs],False)]))
+      targetparts = dict(zip(targetIDs, [vocab.cook_part(words, ngrams) for words in self.normalize_sents([targetlist[i] for i in targetIDs],False)]))
+      empty = vocab.cook_part((), ngrams)
+
+      evalsrc, evaltarget, bounds, ranges = [], [], [], []
+      for sourcegap,targetgap,pregap,postgap in pruned:
+
+        #concatenate all sentences in pregap and postgap alignment pairs
+        gapsrc = [(pregap[0],reduce(concatenate,[srcparts[i] for i in pregap[0]],empty))]
+        gapsrc += [((src,),srcparts[src]) for src in sourcegap]
+        gapsrc.append((postgap[0],reduce(concatenate,[srcparts[i] for i in postgap[0]],empty)))
+
+        gaptarget = [(pregap[1],reduce(concatenate,[targetparts[i] for i in pregap[1]],empty))]
+        gaptarget += [((target,),targetparts[target]) for target in targetgap]
+        gaptarget.append((postgap[1],reduce(concatenate,[targetparts[i] for i in postgap[1]],empty)))
+
+        nSrc = {1: gapsrc}
         for n in range(2,self.options['Nto1']+1):
-          nSrc[n] = self.createNSents(evalsrc,n)
+          nSrc[n] = self.createNSents(gapsrc,n,concatenate,nSrc[n-1])
         for n in range(2,self.options['Nto1']+1):
-          evalsrc += nSrc[n]
+          gapsrc += nSrc[n]
 
-        nTar = {}
+        nTar = {1: gaptarget}
         for n in range(2,self.options['Nto1']+1):
-          nTar[n] = self.createNSents(evaltarget,n)
+          nTar[n] = self.createNSents(gaptarget,n,concatenate,nTar[n-1])
         for n in range(2,self.options['Nto1']+1):
-          evaltarget += nTar[n]
-        
-        evalsrc_raw = [item[1] for item in evalsrc]
-        evaltarget_raw = [item[1] for item in evaltarget]
-        
-        scoredict_raw = self.eval_sents(evalsrc_raw,evaltarget_raw)
-        
+          gaptarget += nTar[n]
+
+        ranges.append((len(evalsrc),len(evalsrc)+len(gapsrc)))
+        bounds += [(len(evaltarget),len(evaltarget)+len(gaptarget)-1)]*len(gapsrc)
+        evalsrc += gapsrc
+        evaltarget += gaptarget
+
+      cooked_targets = bleu.CookedSentences([], ngrams, vocab)
+      for IDs, (length, counts, head, tail) in evaltarget:
+        cooked_targets.append((length, counts, frozenset(counts)))
+
+      if len(gaps) == 1:
+        bounds = None
+
+      #pairs of single sentences may have been scored by the first BLEU pass
+      test_keys, ref_keys = None, None
+      if self.score_cache is not None:
+        test_keys = [IDs[0] if len(IDs) == 1 else None for IDs,part in evalsrc]
+        ref_keys = [IDs[0]+self.score_cache_offset if len(IDs) == 1 else None for IDs,part in evaltarget]
+
+      scoredict_raw = self.eval_sents(evalsrc,evaltarget,cooked_targets=cooked_targets,cooked_tests=[item[1] for item in evalsrc],bounds=bounds,
+                                      score_cache=self.score_cache,test_keys=test_keys,ref_keys=ref_keys)
+
+      scoredicts = []
+      for first,last in ranges:
         scoredict = {}
-        for src,value in list(scoredict_raw.items()):
-            src = evalsrc[src][0]
-            if value:
-                newlist = []
-                for item in value:
-                    score,target,score2 = item
-                    target = evaltarget[target][0]
-                    newlist.append((score,target,score2))
-                scoredict[src] = newlist
-            else:
-                scoredict[src] = []
+        for testID in range(first,last):
+          scoredict[evalsrc[testID][0]] = [(score,evaltarget[target][0],correct) for (score,target,correct) in scoredict_raw[testID]]
+        scoredicts.append(scoredict)
+      return scoredicts
+
+
+    #apply heuristics to align all sentences that remain unaligned after finding best path of 1-to-1 alignments
+    #heuristics include bleu-based 1-to-n alignment and length-based alignment
+    #scoredict holds the scores of the candidates of this gap (see score_gaps()); they are computed if not given.
+    def gapfiller(self, sourcegap, targetgap, pregap, postgap, translist, targetlist, scoredict=None):
+
+      #compile list of sentences in gap that will be considered for BLEU comparison
+      if scoredict is None and (self.options['Nto1'] > 1 or "bleu1to1" in self.options['gapfillheuristics']):
+        scoredict = self.score_gaps([(sourcegap,targetgap,pregap,postgap)], translist, targetlist)[0]
 
       while sourcegap or targetgap:
         pregapsrc,pregaptarget = pregap
@@ -716,7 +1614,7 @@ class Aligner:
                 if newscore > oldscore and newcorrect > oldcorrect and newtarget == pregaptarget:
                     #print('\nsource side: ' + str(combinedID) + ' better than ' + str(pregapsrc))
                     pregap = (combinedID,pregaptarget)
-                    sourcegap.pop(0)
+                    sourcegap.popleft()
                     continue
             
           #try if concatenating source sentences together improves bleu score (end of gap)
@@ -741,7 +1639,7 @@ class Aligner:
                 pregap = (pregapsrc,newtarget)
                 for i in newtarget:
                   if i in targetgap:
-                    del(targetgap[targetgap.index(i)])
+                    targetgap.remove(i)
                 continue
 
           #try if concatenating target sentences together improves bleu score (end of gap)
@@ -752,7 +1650,7 @@ class Aligner:
                 postgap = (postgapsrc,newtarget)
                 for i in newtarget:
                   if i in targetgap:
-                    del(targetgap[targetgap.index(i)])
+                    targetgap.remove(i)
                 continue
         
         #concatenation didn't help, and we still have possible one-to-one alignments
@@ -768,8 +1666,8 @@ class Aligner:
               self.addtoAlignments(pregap)
               #print('\none-to-one: ' + str((sourcegap[0],)) + ' to' + str((targetgap[0],)))
               pregap = ((sourcegap[0],),besttarget)
-              del(sourcegap[0])
-              del(targetgap[0])
+              sourcegap.popleft()
+              targetgap.popleft()
               continue
 
           #Alternative approach: use Gale & Church.
@@ -794,7 +1692,7 @@ class Aligner:
       
         break
         
-      if not pregap in [i[0] for i in self.multialign]:
+      if not pregap in self.multialign.pairs:
         self.addtoAlignments(pregap)
       return postgap
 
@@ -808,53 +1706,14 @@ class Aligner:
       targetlengths = [[len(i[1].strip()) for i in temptargetgap]]
       
       #call gale & church algorithm
-      pairs = sorted(list((align_texts(srclengths, targetlengths)[0])), key=itemgetter(0))
-
-      idict = {}
-      jdict = {}
-      newpairs = []
+      band = self.band_width(len(tempsrcgap), len(temptargetgap), 'galechurch_band')
+      if numpy_enabled:
+        links = vectorized.gale_church_align_blocks(srclengths[0], targetlengths[0], band=band)
+      else:
+        links = align_texts(srclengths, targetlengths, band=band)[0]
 
       #store 1-to-n alignments in single pairs of tuples (instead of using multiple pairs of ints)
-      for i,j in pairs:
-        if i in idict and j in jdict:
-            done = 0
-            for iold1, jold1 in newpairs:
-              if done:
-                break
-              if i in iold1:
-                for iold2, jold2 in newpairs:
-                  if done:
-                    break
-                  if j in jold2:
-                    if not (iold1,jold1) == (iold2,jold2):
-                      del(newpairs[newpairs.index((iold1,jold1))])
-                      del(newpairs[newpairs.index((iold2,jold2))])
-                      inew = tuple(sorted(list(iold1)+list(iold2)))
-                      jnew = tuple(sorted(list(jold1)+list(jold2)))
-                      newpairs.append((inew,jnew))
-                    done = 1
-                    break
-
-        elif i in idict:
-          for iold, jold in newpairs:
-            if i in iold:
-              jnew = tuple(sorted(list(jold)+[j]))
-              newpairs[newpairs.index((iold,jold))] = (iold,jnew)
-              jdict[j] = 0
-              break
-
-        elif j in jdict:
-          for iold, jold in newpairs:
-            if j in jold:
-              inew = tuple(sorted(list(iold)+[i]))
-              newpairs[newpairs.index((iold,jold))] = (inew,jold)
-              idict[i] = 0
-              break
-
-        else:
-          idict[i] = 0
-          jdict[j] = 0
-          newpairs.append(((i,),(j,)))
+      newpairs = link_beads(links)
 
       #Go from Church & Gale's numbering to our IDs
       outpairs = []
@@ -872,13 +1731,22 @@ class Aligner:
 
 
     #get a list of (ID,Sentence) tuples and generate bi- or tri-sentence tuples
-    def createNSents(self,l,n=2):
-      
+    #sentences are joined with concatenate(first,second), by default with a space; they can also be cooked sentences (see score_gaps()).
+    #previous is the result of createNSents(l,n-1); its items are extended by one sentence instead of joining n sentences from scratch
+    def createNSents(self,l,n=2,concatenate=None,previous=None):
+
+      if concatenate is None:
+        concatenate = lambda first, second: first + " " + second
+      if n < 2:
+        return list(l)
+      if previous is None:
+        previous = self.createNSents(l,n-1,concatenate)
+
       out = []
       
       for i in range(len(l)-n+1):
-        IDs = tuple([k for sublist in l[i:i+n] for k in sublist[0]])
-        Sents = " ".join([k[1] for k in l[i:i+n]])
+        IDs = tuple(previous[i][0]) + tuple(l[i+n-1][0])
+        Sents = concatenate(previous[i][1], l[i+n-1][1])
         out.append((IDs,Sents))
       
       return out
@@ -891,7 +1759,7 @@ class Aligner:
         self.multialign.append((pair,aligntype))
       else:
         src,target = pair
-        if len(src) == 1 and len(target) == 1 and (src[0],target[0]) in self.bleualign:
+        if len(src) == 1 and len(target) == 1 and (src[0],target[0]) in self.multialign.bleu_pairs:
           self.multialign.append((pair,"BLEU"))
         else:
           self.multialign.append((pair,"GAPFILLER"))
@@ -921,8 +1789,10 @@ class Aligner:
             self.log("after gap filling, " + str(multialigntargetcount) + ' out of '+ str(target_len) + ' target sentences aligned ' + str(100*multialigntargetcount/float(target_len)) + '%',2)
 
 
-    #print out some debugging info, and print output to file
-    def printout(self, sourcelist, translist, targetlist):
+    #print out some debugging info, and print output to file.
+    #last is the source and target ID of the end of the previous alignment, from which on unaligned sentences are printed with printempty;
+    #the IDs of the end of the last alignment are returned (see streamloop(), which prints articles in several parts)
+    def printout(self, sourcelist, translist, targetlist, last=(0,0)):
 
       self.print_alignment_statistics(len(sourcelist), len(targetlist))
 
@@ -940,7 +1810,7 @@ class Aligner:
 
       self.multialign = sorted(self.multialign,key=itemgetter(0))
       sentscores = {}
-      lastsrc,lasttarget = 0,0
+      lastsrc,lasttarget = last
       for j,(src,target) in enumerate([i[0] for i in self.multialign]):
 
         self.log("alignment: {0} - {1}".format(",".join(map(str,src)), ",".join(map(str,target))),2)
@@ -990,6 +1860,21 @@ class Aligner:
             self.out1.write('\n'.join(sources) + '\n')
             self.out2.write('\n'.join(targets) + '\n')
 
+      return lastsrc,lasttarget
+
+
+    #with printempty, print the unaligned sentences after last (see printout()) and before end, as in a gap between two alignments.
+    #returns the IDs of the last sentences that are printed
+    def printout_unaligned(self, sourcelist, targetlist, last, end):
+
+      if self.options['printempty'] and self.out1 and self.out2 and not self.options['filter'] and not self.options['factored']:
+        sources = sourcelist[last[0]+1:end[0]] + ['' for ID in range(last[1]+1,end[1])]
+        targets = ['' for ID in range(last[0]+1,end[0])] + targetlist[last[1]+1:end[1]]
+        if sources:
+          self.out1.write('\n'.join(sources) + '\n')
+          self.out2.write('\n'.join(targets) + '\n')
+      return max(last[0],end[0]-1),max(last[1],end[1]-1)
+
 
     #get BLEU score of sentence pair (for filtering)
     def check_sentence_pair(self, j, src, trans, target, source_out, target_out, sentscores):
@@ -1132,6 +2017,8 @@ class Aligner:
 
     #close all files opened by __init__
     def close_file_streams(self):
+        if self.cook_cache is not None:
+            self.cook_cache.close()
         if self.close_src:
             self.src.close()
         if self.close_target:
@@ -1161,23 +2048,58 @@ class Aligner:
 if multiprocessing_enabled:
   class AlignMultiprocessed(multiprocessing.Process,Aligner):
 
-    def __init__(self,tasks,options,scores,log):
+    def __init__(self,tasks,options,finished,log,index=None):
       multiprocessing.Process.__init__(self)
       self.options = options
       self.tasks = tasks
-      self.scores = scores
+      self.finished = finished
       self.log = log
+      self.index = index
+      #the last article read from the index or received, as (article number, article); consecutive pieces are often of the same article
+      self.article = (None, None)
+      #the shared memory block of self.article, with the shared_memory option
+      self.block = None
       self.bleualign = []
       self.scoredict = None
+      self.cook_cache = None
+      self.cooked_article = None
+      self.score_cache = None
 
     def run(self):
       
-      i,data = self.tasks.get()
+      i,task = self.tasks.get()
       while i != None:
 
-        self.log('reading in article ' + str(i) + ': ',1)
-        sourcelist,targetlist,translist1,translist2 = data
-        self.multialign = self.process(sourcelist,targetlist,translist1,translist2)
-        self.scores[i] = (data,self.multialign,self.bleualign,self.scoredict)
+        (article,k,num_pieces,piece),data = task
+        self.log('reading in article ' + str(article) + ': ',1)
+        if data is None:
+          if self.article[0] != article:
+            self.article = (article, read_article(self.index,article,self.options))
+          sourcelist,targetlist,translist1,translist2 = self.article[1]
+        elif isinstance(data,shared.SharedArticle if shared_memory_enabled else ()):
+          if self.article[0] != article:
+            if self.block is not None:
+              self.block.close()
+            self.block,sentences = data.attach()
+            self.article = (article, sentences)
+          sourcelist,targetlist,translist1,translist2 = self.article[1]
+        else:
+          #each piece comes with its own copy of the article; the first one is kept, so that process()
+          #reuses the cooked sentences of the article for the following pieces
+          if self.article[0] != article:
+            self.article = (article, data)
+          sourcelist,targetlist,translist1,translist2 = self.article[1]
+        self.multialign = self.process(sourcelist,targetlist,translist1,translist2,piece)
+        #the parent needs the article (unless it reads it from the index) only once, with its last piece,
+        #and the first-pass alignments and scores only for the statistics of print_alignment_statistics()
+        if k < num_pieces-1:
+          data = None
+        if self.options['verbosity'] >= 2:
+          self.finished.put((i,(task[0],data,list(self.multialign),self.bleualign,self.scoredict)))
+        else:
+          self.finished.put((i,(task[0],data,list(self.multialign),[],None)))
         
-        i,data = self.tasks.get()
+        i,task = self.tasks.get()
+
+      if self.block is not None:
+        self.block.close()
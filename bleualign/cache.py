@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright © 2010 University of Zürich
+# Author: Rico Sennrich <sennrich@cl.uzh.ch>
+# For licensing information, see LICENSE
+
+'''Persistent cache of normalized sentences.
+
+Normalization and tokenization (bleu.normalize()) is the most expensive part of cooking a sentence,
+and it is repeated for the same corpus every time it is aligned (e.g. when tuning options or comparing MT systems).
+TokenCache stores the token sequence of each sentence in an sqlite3 database, keyed by a hash of the sentence.
+The database can be shared by several processes; entries that have not been used for the longest time are evicted
+once the cache holds more than max_entries sentences. New entries and the times of use are written in one transaction
+by flush(), which the caller invokes once per article (and close() at the end).
+'''
+
+from __future__ import division, unicode_literals
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import bleualign.score as bleu
+
+# sqlite3 limits the number of variables in a statement
+chunk_size = 500
+
+
+class TokenCache(object):
+
+    def __init__(self, path, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = None
+        self.pid = None
+        self.hits = 0
+        self.misses = 0
+        # entries that have not been written yet, and keys of entries found in the database since the last flush()
+        self.new = {}
+        self.used = set()
+
+    def connect(self):
+        # connections cannot be shared between processes; each worker opens its own
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.pid = os.getpid()
+            try:
+                self.connection.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.OperationalError:
+                pass
+            with self.connection:
+                self.connection.execute('CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, tokens TEXT, used REAL)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS tokens_used ON tokens (used)')
+        return self.connection
+
+    def close(self):
+        if self.connection is not None and self.pid == os.getpid():
+            self.flush()
+            self.connection.close()
+        self.connection = None
+
+    def key(self, sentence, charlevel):
+        # normalization depends on these settings, so they are part of the key
+        settings = '{0} {1} {2}\t'.format(int(bool(charlevel)), int(bool(bleu.preserve_case)), int(bool(bleu.nonorm)))
+        return hashlib.sha1((settings + sentence).encode('UTF-8')).hexdigest()
+
+    def normalize(self, sentences, charlevel=False):
+        '''Return bleu.normalize() of each sentence, taking it from the cache if possible.'''
+        connection = self.connect()
+        keys = [self.key(sentence, charlevel) for sentence in sentences]
+        unique_keys = [key for key in set(keys) if key not in self.new]
+
+        found = {}
+        for i in range(0, len(unique_keys), chunk_size):
+            chunk = unique_keys[i:i+chunk_size]
+            query = 'SELECT key, tokens FROM tokens WHERE key IN ({0})'.format(','.join('?'*len(chunk)))
+            for key, tokens in connection.execute(query, chunk):
+                found[key] = json.loads(tokens)
+
+        new = self.new
+        result = []
+        for key, sentence in zip(keys, sentences):
+            if key in found:
+                self.hits += 1
+                result.append(found[key])
+                # later normalizations of the same sentence (e.g. in gaps, see Aligner.score_gaps()) then skip the tokenizer
+                bleu.remember(tuple(sentence) if charlevel else sentence, found[key])
+                continue
+            if key not in new:
+                self.misses += 1
+                if charlevel:
+                    new[key] = bleu.normalize(tuple(sentence))
+                else:
+                    new[key] = bleu.normalize(sentence)
+            result.append(new[key])
+
+        self.used.update(found)
+        return result
+
+    def flush(self):
+        '''Add new entries, mark used entries as recently used, and evict old entries.
+        The cache is only an optimization: if another process keeps the database locked, we give up.'''
+        new, used = self.new, list(self.used)
+        self.new, self.used = {}, set()
+        if not (new or used):
+            return
+        connection = self.connect()
+        now = time.time()
+        try:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)',
+                                       [(key, json.dumps(tokens), now) for key, tokens in new.items()])
+                for i in range(0, len(used), chunk_size):
+                    chunk = used[i:i+chunk_size]
+                    connection.execute('UPDATE tokens SET used = ? WHERE key IN ({0})'.format(','.join('?'*len(chunk))), [now] + chunk)
+                if new:
+                    size = connection.execute('SELECT COUNT(*) FROM tokens').fetchone()[0]
+                    if size > self.max_entries:
+                        connection.execute('DELETE FROM tokens WHERE key IN (SELECT key FROM tokens ORDER BY used LIMIT ?)',
+                                           (size - self.max_entries,))
+        except sqlite3.OperationalError:
+            pass
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from __future__ import division
 import math
 
 # Based on Gale & Church 1993, 
@@ -94,59 +95,161 @@ def align_probability(i, j, source_sentences, target_sentences, alignment, param
     return 2 * (1 - norm_cdf(abs(delta))) * params.PRIORS[alignment]
 
 
-def align_blocks(source_sentences, target_sentences, params = LanguageIndependent):
+# bead lengths (in characters) up to exact_length are scored as they are; longer ones are rounded to bucket_bits
+# significant bits. This bounds the number of distinct bead scores, which are cached (see bead_log_probability()).
+exact_length = 512
+bucket_bits = 8
+
+# the cache of bead scores of each set of parameters is cleared when it holds more entries than this
+max_cached_scores = 300000
+cached_scores = {}
+
+
+def bucket(length):
+    """Rounds a bead length above C{exact_length} to C{bucket_bits} significant bits."""
+    if length <= exact_length:
+        return length
+    shift = length.bit_length() - bucket_bits
+    return ((length + (1 << (shift - 1))) >> shift) << shift
+
+
+def length_log_probability(l_s, l_t, params):
+    """Returns the logarithm of the probability of a bead with C{l_s} source and C{l_t} target characters,
+    without the prior probability of its alignment type (see L{align_probability}), or -infinity where that probability
+    rounds to 0 (for length differences of more than about 8 standard deviations). Such beads are impossible, as they were
+    when probabilities were multiplied.
+    """
+    try:
+        m = (l_s + l_t / params.AVERAGE_CHARACTERS) / 2
+        delta = (l_t - l_s * params.AVERAGE_CHARACTERS) / math.sqrt(m * params.VARIANCE_CHARACTERS)
+    except ZeroDivisionError:
+        delta = infinity
+
+    # exactly the value of align_probability(), so that alignments do not change
+    probability = 2 * (1 - norm_cdf(abs(delta)))
+    if probability > 0:
+        return math.log(probability)
+    return -infinity
+
+
+def bead_log_probability(l_s, l_t, alignment, params, cache):
+    """Returns the logarithm of the probability of a bead with C{l_s} source and C{l_t} target characters
+    and a specific C{alignment} type. Long beads are bucketed (see L{bucket}), and the result is kept in C{cache}.
+    """
+    if l_s > exact_length or l_t > exact_length:
+        l_s, l_t = bucket(l_s), bucket(l_t)
+    key = (alignment, l_s, l_t)
+    score = cache.get(key)
+    if score is None:
+        if len(cache) >= max_cached_scores:
+            cache.clear()
+        score = cache[key] = math.log(params.PRIORS[alignment]) + length_log_probability(l_s, l_t, params)
+    return score
+
+
+def band_bounds(num_source, num_target, band):
+    """Returns the first and last target sentence that each source sentence may be aligned to:
+    those within C{band} sentences of the diagonal from the first to the last sentence pair (all of them if C{band} is None).
+    Both bounds never decrease from one source sentence to the next.
+    """
+    if band is None:
+        return [(0, num_target - 1)] * num_source
+    slope = (num_target - 1) / max(1, num_source - 1)
+    bounds = []
+    for i in range(num_source):
+        center = i * slope
+        bounds.append((max(0, int(math.ceil(center - band))), min(num_target - 1, int(math.floor(center + band)))))
+    return bounds
+
+
+def path_at_band_edge(pointer, bounds, num_target):
+    """Follows the backpointers from the last sentence pair, and returns True if the path leaves the band given by C{bounds}
+    or touches one of its edges; a better path may then lie outside of it.
+    C{pointer(i, j)} returns the alignment type of cell (i, j), or None if the cell is outside of the band.
+    """
+    i, j = len(bounds) - 1, num_target - 1
+    while i != -1 and j != -1:
+        lo, hi = bounds[i]
+        a = pointer(i, j)
+        if a is None or (j == lo and lo > 0) or (j == hi and hi < num_target - 1):
+            return True
+        i, j = i - a[0], j - a[1]
+    return False
+
+
+def align_blocks(source_sentences, target_sentences, params = LanguageIndependent, band = None):
     """Creates the sentence alignment of two blocks of texts (usually paragraphs).
 
     @param source_sentences: The list of source sentence lengths.
     @param target_sentences: The list of target sentence lengths.
     @param params: the sentence alignment parameters.
+    @param band: if given, only sentence pairs within this distance of the diagonal (see L{band_bounds}) are considered.
+        The band is doubled until the best path does not touch its edges.
 
     @return: The sentence alignments, a list of index pairs.
     """
     alignment_types = list(params.PRIORS.keys())
+    cache = cached_scores.setdefault(params, {})
+    # each alignment type in ascending order, with the row of D in which its beads start
+    steps = [(a, -(1 + a[0]), a[0], a[1]) for a in sorted(alignment_types)]
 
-    # there are always three rows in the history (with the last of them being filled)
-    # and the rows are always |target_text| + 2, so that we never have to do
-    # boundary checks
-    D = [(len(target_sentences) + 2) * [0] for x in range(2)]
-
-    # for the first sentence, only substitution, insertion or deletion are
-    # allowed, and they are all equally likely ( == 1)
+    # prefix sums of the sentence lengths, for the lengths of beads
+    source_ends, target_ends = [0], [0]
+    for length in source_sentences:
+        source_ends.append(source_ends[-1] + length)
+    for length in target_sentences:
+        target_ends.append(target_ends[-1] + length)
 
-    D.append([0, 1])
-    try:
-      D[-2][1] = 1
-      D[-2][2] = 1
-    except:
-      pass
-
-    backlinks = {}
-
-    for i in range(len(source_sentences)):
-        for j in range(len(target_sentences)):
-            m = []
-            for a in alignment_types:
-                k = D[-(1 + a[0])][j + 2 - a[1]]
-                if k > 0:
-                    p = k * \
-                      align_probability(i, j, source_sentences, target_sentences, a, params)
-                    m.append((p, a))
-
-            if len(m) > 0:
-                v = max(m)
-                backlinks[(i, j)] = v[1]
-                D[-1].append(v[0])
-            else:
-                backlinks[(i, j)] = (1, 1)
-                D[-1].append(0)
-
-        D.pop(0)
-        D.append([0, 0])
-
-    return trace(backlinks, source_sentences, target_sentences)
-
-
-def align_texts(source_blocks, target_blocks, params = LanguageIndependent):
+    while True:
+        bounds = band_bounds(len(source_sentences), len(target_sentences), band)
+
+        # there are always three rows in the history (with the last of them being filled).
+        # Each row maps target sentences to log probabilities; missing cells (outside of the band) have probability 0.
+        # Row -1 and column -1 are the boundary: for the first sentence, only substitution, insertion or deletion are
+        # allowed, and they are all equally likely ( == 1)
+        # Probabilities are multiplied in log space, since their product underflows on long blocks.
+        D = [{}, {-1: 0.0, 0: 0.0}, {-1: 0.0}]
+
+        backlinks = {}
+
+        for i in range(len(source_sentences)):
+            lo, hi = bounds[i]
+            source_end = source_ends[i + 1]
+            row = D[-1]
+            for j in range(lo, hi + 1):
+                target_end = target_ends[j + 1]
+                best, best_type = -infinity, None
+                for a, previous_row, s, t in steps:
+                    k = D[previous_row].get(j - t, -infinity)
+                    if k > -infinity:
+                        l_s = source_end - source_ends[i + 1 - s]
+                        l_t = target_end - target_ends[j + 1 - t]
+                        # the lookup of bead_log_probability(), inlined for speed
+                        score = cache.get((a, l_s, l_t))
+                        if score is None:
+                            score = bead_log_probability(l_s, l_t, a, params, cache)
+                        # on ties, the later (greater) alignment type wins, as with max() over (probability, type)
+                        if k + score >= best:
+                            best, best_type = k + score, a
+
+                if best_type is not None:
+                    backlinks[(i, j)] = best_type
+                    row[j] = best
+                else:
+                    backlinks[(i, j)] = (1, 1)
+                    row[j] = -infinity
+
+            D.pop(0)
+            D.append({})
+
+        if band is None or not path_at_band_edge(lambda i, j: backlinks.get((i, j)), bounds, len(target_sentences)):
+            return trace(backlinks, source_sentences, target_sentences)
+        band *= 2
+        if band >= len(target_sentences) - 1:
+            band = None
+
+
+def align_texts(source_blocks, target_blocks, params = LanguageIndependent, band = None):
     """Creates the sentence alignment of two texts.
 
     Texts can consist of several blocks. Block boundaries cannot be crossed by sentence 
@@ -158,13 +261,14 @@ def align_texts(source_blocks, target_blocks, params = LanguageIndependent):
     @param source_blocks: The list of blocks in the source text.
     @param target_blocks: The list of blocks in the target text.
     @param params: the sentence alignment parameters.
+    @param band: the maximal distance of aligned sentences from the diagonal of each block (see L{align_blocks}).
 
     @returns: A list of sentence alignment lists
     """
     if len(source_blocks) != len(target_blocks):
         raise ValueError("Source and target texts do not have the same number of blocks.")
     
-    return [align_blocks(source_block, target_block, params) 
+    return [align_blocks(source_block, target_block, params, band) 
             for source_block, target_block in zip(source_blocks, target_blocks)]
 
 
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright © 2010 University of Zürich
+# Author: Rico Sennrich <sennrich@cl.uzh.ch>
+# For licensing information, see LICENSE
+
+'''Byte offsets of the articles of a bitext, for random access to single articles.
+
+With several processes, Aligner.mainloop() used to read all articles in one producer process and send their sentences to the
+workers through a queue. ArticleIndex scans the input files once (memory-mapped, with regular expressions) and records where
+each article starts and ends in the source and target text and in each of their translations. Workers then read the articles
+they are assigned directly from disk.
+
+Articles are delimited by lines with the end_of_article_marker in the source and target text, as in align.collect_article().
+A translation has one line per line of the text it translates (including the marker lines), so its articles are found by
+line numbers. Files with other line breaks than '\n' and '\r\n' are not indexed, since universal newlines would count them
+differently from the byte scan.
+'''
+
+from __future__ import division, unicode_literals
+import io
+import re
+import mmap
+from contextlib import contextmanager
+
+@contextmanager
+def mapped(path):
+    '''A read-only memory map of a file (or an empty string for an empty file).'''
+    with io.open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b''
+            return
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+def check_line_breaks(data):
+    if re.search(b'\r(?!\n)', data):
+        raise ValueError('file has line breaks other than \\n and \\r\\n')
+
+
+def article_starts(data, marker):
+    '''Return the byte offsets and line numbers of the starts of all articles (those after the first are the lines that
+    follow a marker line).'''
+    check_line_breaks(data)
+    offsets, lines = [0], [0]
+    position, line = 0, 0
+    for match in re.finditer(b'^' + re.escape(marker.encode('UTF-8')), data, re.M):
+        end = data.find(b'\n', match.start())
+        if end == -1:
+            end = len(data)
+        # the same test as in align.read_lines()
+        if data[match.start():end].decode('UTF-8').rstrip() != marker:
+            continue
+        line += data[position:end].count(b'\n') + 1
+        position = min(end + 1, len(data))
+        offsets.append(position)
+        lines.append(line)
+    return offsets, lines
+
+
+def line_offsets(data, lines):
+    '''Return the byte offsets of the given (ascending) line numbers, or the end of the file for lines beyond it.'''
+    offsets = []
+    position, line = 0, 0
+    for wanted in lines:
+        while line < wanted:
+            end = data.find(b'\n', position)
+            if end == -1:
+                position = len(data)
+                break
+            position, line = end + 1, line + 1
+        offsets.append(position)
+    return offsets
+
+
+class ArticleIndex(object):
+
+    def __init__(self, src, srctotarget, target, targettosrc, marker):
+        '''Index the articles of the given files (paths). Raises ValueError if a file cannot be indexed.'''
+        self.paths = [src] + list(srctotarget) + [target] + list(targettosrc)
+        self.num_translations = (len(srctotarget), len(targettosrc))
+
+        sides = []
+        for text, translations in ((src, srctotarget), (target, targettosrc)):
+            with mapped(text) as data:
+                starts = article_starts(data, marker)
+                sides.append((starts, len(data), translations))
+
+        # collect_article() stops at the end of the text with fewer markers
+        self.num_articles = min(len(offsets) for (offsets, lines), size, translations in sides)
+
+        # for each file (in the order of self.paths), the byte offset of the start of each article, and of the end of the last one
+        self.offsets = []
+        for (offsets, lines), size, translations in sides:
+            ends = offsets[self.num_articles:self.num_articles+1] or [size]
+            self.offsets.append(offsets[:self.num_articles] + ends)
+            for path in translations:
+                with mapped(path) as data:
+                    check_line_breaks(data)
+                    # the last article of the text may end at the end of the file, and so does its translation
+                    offsets = line_offsets(data, lines[:self.num_articles+1])
+                    self.offsets.append(offsets + [len(data)] * (self.num_articles + 1 - len(offsets)))
+
+    def __len__(self):
+        return self.num_articles
+
+    def streams(self, i):
+        '''Return the text of article i as (src, srctotarget, target, targettosrc) file objects, for align.collect_article().'''
+        streams = []
+        for path, offsets in zip(self.paths, self.offsets):
+            with io.open(path, 'rb') as f:
+                f.seek(offsets[i])
+                text = f.read(offsets[i+1] - offsets[i])
+            streams.append(io.TextIOWrapper(io.BytesIO(text), encoding='UTF-8'))
+        n1, n2 = self.num_translations
+        return streams[0], streams[1:1+n1], streams[1+n1], streams[2+n1:]
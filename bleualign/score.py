@@ -18,6 +18,7 @@ The reason for breaking the BLEU computation into three phases cook_refs(), cook
 
 from __future__ import division, print_function
 import sys, math, re, xml.sax.saxutils
+from collections import OrderedDict
 
 # Added to bypass NIST-style pre-processing of hyp and ref files -- wade
 nonorm = 0
@@ -44,8 +45,40 @@ normalize2 = [(re.compile(pattern), replace) for (pattern, replace) in normalize
 #combine normalize2 into a single regex.
 normalize3 = re.compile(r'([\{-\~\[-\` -\&\(-\+\:-\@\/])|(?:(?<![0-9])([\.,]))|(?:([\.,])(?![0-9]))|(?:(?<=[0-9])(-))')
 
+#find the tokens that normalize3.split() produces (without the empty strings and spaces) in a single pass:
+#runs of characters that are not split off, or a single character that is.
+normalize3_tokens = re.compile(r'(?:[^\{-\~\[-\` -\&\(-\+\:-\@\/\.,\-]+|(?<=[0-9])[\.,](?=[0-9])|(?<![0-9])-)+|[\{-\~\[-\`!-\&\(-\+\:-\@\/\.,\-]')
+
+#normalize() remembers the results for this many strings (least recently used ones are forgotten first).
+#sentences are only normalized again within an article, and Aligner clears the memo between articles (see its normalize_memo_size option)
+normalize_memo_size = 5000
+normalize_memo = OrderedDict()
+
 def normalize(s):
     '''Normalize and tokenize text. This is lifted from NIST mteval-v11a.pl.'''
+    key = (s, nonorm, preserve_case)
+    try:
+        words = normalize_memo.get(key)
+    except TypeError:
+        return normalize_uncached(s)
+    if words is None:
+        words = normalize_uncached(s)
+        normalize_memo[key] = tuple(words)
+        if len(normalize_memo) > normalize_memo_size:
+            normalize_memo.popitem(last=False)
+        return words
+    # mark as recently used
+    del normalize_memo[key]
+    normalize_memo[key] = words
+    return list(words)
+
+def remember(s, words):
+    '''Add words, the result of normalize(s) that was computed elsewhere (e.g. taken from a cache), to the memo of normalize().'''
+    normalize_memo[(s, nonorm, preserve_case)] = tuple(words)
+    if len(normalize_memo) > normalize_memo_size:
+        normalize_memo.popitem(last=False)
+
+def normalize_uncached(s):
     # Added to bypass NIST-style pre-processing of hyp and ref files -- wade
     if (nonorm):
         return s.split()
@@ -53,15 +86,15 @@ def normalize(s):
         s.split()
     except:
         s = " ".join(s)
-    # language-independent part:
-    for (pattern, replace) in normalize1:
-        s = re.sub(pattern, replace, s)
-    s = xml.sax.saxutils.unescape(s, {'&quot;':'"'})
+    # language-independent part (none of the patterns can match without these characters):
+    if '<' in s or '&' in s or '\n' in s:
+        for (pattern, replace) in normalize1:
+            s = re.sub(pattern, replace, s)
+        s = xml.sax.saxutils.unescape(s, {'&quot;':'"'})
     # language-dependent part (assuming Western languages):
-    s = " %s " % s
     if not preserve_case:
         s = s.lower()         # this might not be identical to the original
-    return [tok for tok in normalize3.split(s) if tok and tok != ' ']
+    return normalize3_tokens.findall(s)
 
 def count_ngrams(words, n=4):
     counts = {}
@@ -71,6 +104,112 @@ def count_ngrams(words, n=4):
             counts[ngram] = counts.get(ngram, 0)+1
     return counts
 
+class NgramVocabulary(object):
+    '''Maps n-grams to small integers, so that counts and sets of n-grams can be hashed and
+    intersected without building tuples of strings. An n-gram is identified by the ID of its
+    prefix and its last word. self.order[ID] is the length of the n-gram minus one.
+    Use one vocabulary for all sentences that are compared with each other.'''
+
+    def __init__(self):
+        self.ids = {}
+        self.order = []
+
+    def count_ngrams(self, words, n=4):
+        '''Like count_ngrams(), but with n-gram IDs as keys.'''
+        ids = self.ids
+        counts = {}
+        prefixes = None
+        for k in range(n):
+            current = []
+            for i in range(len(words)-k):
+                if k:
+                    key = (prefixes[i], words[i+k])
+                else:
+                    key = words[i]
+                ngram = ids.get(key)
+                if ngram is None:
+                    ngram = ids[key] = len(self.order)
+                    self.order.append(k)
+                current.append(ngram)
+                counts[ngram] = counts.get(ngram, 0)+1
+            prefixes = current
+        return counts
+
+    def cook_part(self, words, n=4):
+        '''Cook a normalized sentence so that it can be concatenated with others (see concatenate()).
+        Returns (length, counts, head, tail), with the n-gram counts by ID and the first and last n-1 words.'''
+        words = tuple(words)
+        return (len(words), self.count_ngrams(words, n), words[:n-1], words[max(0, len(words)-n+1):])
+
+    def concatenate(self, first, second, n=4):
+        '''Cook the concatenation of two parts returned by cook_part() or concatenate().
+        Since the tokens of "A B" are those of A followed by those of B, its n-grams are those of both parts
+        plus the ones that cross the boundary, which only depend on the last and first n-1 words.'''
+        length1, counts1, head1, tail1 = first
+        length2, counts2, head2, tail2 = second
+        if len(counts1) < len(counts2):
+            counts1, counts2 = counts2, counts1
+        counts = dict(counts1)
+        for ngram, count in counts2.items():
+            counts[ngram] = counts.get(ngram, 0)+count
+
+        ids = self.ids
+        words = tail1 + head2
+        for i in range(len(tail1)):
+            ngram = None
+            for k in range(min(n, len(words)-i)):
+                if k:
+                    key = (ngram, words[i+k])
+                else:
+                    key = words[i]
+                ngram = ids.get(key)
+                if ngram is None:
+                    ngram = ids[key] = len(self.order)
+                    self.order.append(k)
+                if i+k >= len(tail1):
+                    counts[ngram] = counts.get(ngram, 0)+1
+
+        words = head1 + head2
+        head = words[:n-1]
+        words = tail1 + tail2
+        tail = words[max(0, len(words)-n+1):]
+        return (length1+length2, counts, head, tail)
+
+class CookedSentences(object):
+    '''Cooked reference sentences (see cook_normalized()) of one article, with their n-gram vocabulary
+    and an inverted index from n-grams of the highest order to the IDs of the sentences that contain them.
+    Build this once per article and compare all test sentences to it.'''
+
+    def __init__(self, sentences, n=4, vocab=None):
+        '''sentences is a list of normalized sentences (see normalize()).'''
+        if vocab is None:
+            vocab = NgramVocabulary()
+        self.vocab = vocab
+        self.n = n
+        self.cooked = []
+        self.index = {}
+        # sparse count matrices for the numpy backend (see vectorized.py); built on first use
+        self.matrices = None
+        # identical sentences share the same cooked object
+        cache = {}
+        for words in sentences:
+            words = tuple(words)
+            if words not in cache:
+                cache[words] = cook_normalized(words, n, vocab)
+            self.append(cache[words])
+
+    def append(self, cooked):
+        '''Add a sentence that has already been cooked with self.vocab, as (length, counts, set of n-grams).'''
+        ID = len(self.cooked)
+        self.cooked.append(cooked)
+        for ngram in cooked[2]:
+            if self.vocab.order[ngram] == self.n-1:
+                self.index.setdefault(ngram, []).append(ID)
+        self.matrices = None
+
+    def __len__(self):
+        return len(self.cooked)
+
 def cook_refs(refs, n=4):
     '''Takes a list of reference sentences for a single segment
     and returns an object that encapsulates everything that BLEU
@@ -84,13 +223,20 @@ def cook_refs(refs, n=4):
             maxcounts[ngram] = max(maxcounts.get(ngram,0), count)
     return ([len(ref) for ref in refs], maxcounts)
 
-def cook_ref_set(ref, n=4):
+def cook_ref_set(ref, n=4, vocab=None):
     '''Takes a reference sentences for a single segment
     and returns an object that encapsulates everything that BLEU
-    needs to know about them.  Also provides a set cause bleualign wants it'''
-    ref = normalize(ref)
-    counts = count_ngrams(ref, n)
-    return (len(ref), counts, frozenset(counts))
+    needs to know about them.  Also provides a set cause bleualign wants it
+    If an NgramVocabulary is given, n-grams are represented by their IDs.'''
+    return cook_normalized(normalize(ref), n, vocab)
+
+def cook_normalized(words, n=4, vocab=None):
+    '''Like cook_ref_set(), but for a sentence that has already been normalized.'''
+    if vocab is not None:
+        counts = vocab.count_ngrams(words, n)
+    else:
+        counts = count_ngrams(words, n)
+    return (len(words), counts, frozenset(counts))
 
 
 
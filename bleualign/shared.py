@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright © 2010 University of Zürich
+# Author: Rico Sennrich <sennrich@cl.uzh.ch>
+# For licensing information, see LICENSE
+
+'''Transport of articles to worker processes in shared memory (requires Python 3.8).
+
+Without it, the producer process pickles the sentences of each article (and each piece of it, see align.split_article())
+through the task queue, and each worker holds its own copy. share_article() instead writes all sentences of an article into
+one multiprocessing.shared_memory block: an array of byte offsets, followed by the UTF-8 encoded sentences.
+Only a small SharedArticle is sent to the workers, which attach to the block and read sentences from it as they need them,
+through SharedSentences (a read-only sequence that can stand in for the lists of collect_article()).
+The main process prints the article from the same block, and then removes it.
+'''
+
+from __future__ import division, unicode_literals
+import struct
+from array import array
+from multiprocessing import shared_memory, resource_tracker
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+
+def start_resource_tracker():
+    '''Blocks are created by the producer process. Their resource tracker must be the one of the main process
+    (which removes the blocks); otherwise, the blocks are removed when the producer exits.'''
+    resource_tracker.ensure_running()
+
+
+def share_article(article, factored):
+    '''Write an article (as returned by align.collect_article()) into a new shared memory block, and return its SharedArticle.'''
+    sourcelist, targetlist, translist1, translist2 = article
+    # with factored input, the source and target sentences are (raw sentence, factored sentence)
+    lists = [(sourcelist, 2 if factored else 1), (targetlist, 2 if factored else 1)] + [(translist, 1) for translist in translist1 + translist2]
+
+    encoded = []
+    for sentences, width in lists:
+        for item in sentences:
+            encoded.extend(string.encode('UTF-8') for string in (item if width == 2 else (item,)))
+    offsets = array('q', [0])
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+
+    header = len(offsets) * offsets.itemsize
+    block = shared_memory.SharedMemory(create=True, size=max(1, header + offsets[-1]))
+    block.buf[:header] = offsets.tobytes()
+    block.buf[header:header + offsets[-1]] = b''.join(encoded)
+    shared = SharedArticle(block.name, header, [(len(sentences), width) for sentences, width in lists], len(translist1))
+    block.close()
+    return shared
+
+
+class SharedArticle(object):
+    '''The location of an article in shared memory (see share_article()).'''
+
+    def __init__(self, name, header, lists, num_translations):
+        self.name = name
+        self.header = header
+        self.lists = lists
+        self.num_translations = num_translations
+
+    def attach(self):
+        '''Return the shared memory block (to be closed by the caller) and the article in the format of align.collect_article().'''
+        block = shared_memory.SharedMemory(name=self.name)
+        lists = []
+        first = 0
+        for length, width in self.lists:
+            lists.append(SharedSentences(block, self.header, first, length, width))
+            first += length * width
+        n = self.num_translations
+        return block, (lists[0], lists[1], lists[2:2+n], lists[2+n:])
+
+
+class SharedSentences(Sequence):
+    '''Read-only sequence of the sentences (strings, or tuples of width strings) first to first+length*width in a block.
+    Sentences are decoded when they are accessed; slices are views of the same block.'''
+
+    def __init__(self, block, header, first, length, width):
+        self.block = block
+        self.header = header
+        self.first = first
+        self.length = length
+        self.width = width
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.length)
+            if step != 1:
+                return [self[k] for k in range(start, stop, step)]
+            return SharedSentences(self.block, self.header, self.first + start*self.width, max(0, stop-start), self.width)
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError('sentence index out of range')
+        k = self.first + i*self.width
+        strings = tuple(self.string(k+w) for w in range(self.width))
+        return strings[0] if self.width == 1 else strings
+
+    def string(self, k):
+        # no views of the buffer are kept, so that the block can be closed while sequences still refer to it
+        start, end = struct.unpack_from('2q', self.block.buf, 8*k)
+        return str(self.block.buf[self.header+start:self.header+end], 'UTF-8')
@@ -0,0 +1,334 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright © 2010 University of Zürich
+# Author: Rico Sennrich <sennrich@cl.uzh.ch>
+# For licensing information, see LICENSE
+
+'''Vectorized versions of Aligner.eval_sents(), the dense pathfinder and Gale & Church's algorithm, using NumPy.
+
+For eval_sents(), all sentences are turned into per-order sparse count matrices (in coordinate format: row, column, count),
+with one column per distinct n-gram. Clipped n-gram matches are then computed for all sentence pairs at once,
+and so are the brevity penalties and the bidirectional BLEU scores.
+The results are identical to the pure-Python implementations in bleualign.align and bleualign.gale_church.
+'''
+
+from __future__ import division
+import math
+import numpy
+import bleualign.gale_church as gale_church
+from bleualign.gale_church import LanguageIndependent
+
+# maximal number of cells (test sentences * target sentences) that are scored in one block
+block_cells = 2**22
+
+
+def cook_matrix(counts, n, vocab):
+    '''Return one (rows, columns, counts) triple per n-gram order, given the n-gram counts of each sentence.
+    The n-gram IDs of vocab (a bleu.NgramVocabulary) are the column IDs.'''
+    entries = [([], [], []) for k in range(n)]
+    for row, sentence_counts in enumerate(counts):
+        for ngram, count in sentence_counts.items():
+            rows, cols, ngram_counts = entries[vocab.order[ngram]]
+            rows.append(row)
+            cols.append(ngram)
+            ngram_counts.append(count)
+    matrices = []
+    for rows, cols, ngram_counts in entries:
+        matrices.append((numpy.array(rows, dtype=numpy.int64),
+                         numpy.array(cols, dtype=numpy.int64),
+                         numpy.array(ngram_counts, dtype=numpy.int64)))
+    return matrices
+
+
+def rows_slice(matrix, first, last):
+    '''The entries of rows first to last-1 of a matrix from cook_matrix(), whose entries are sorted by row; rows start at 0.'''
+    rows, cols, counts = matrix
+    start, end = numpy.searchsorted(rows, [first, last], side='left')
+    return rows[start:end] - first, cols[start:end], counts[start:end]
+
+
+def clipped_matches(test, ref, first, last, ref_first, ref_last):
+    '''Sum of min(test count, ref count) over all shared n-grams,
+    for test rows first to last-1 and reference rows ref_first to ref_last-1.
+    Returns a dense matrix of shape (last-first, ref_last-ref_first).'''
+    test_rows, test_cols, test_counts = rows_slice(test, first, last)
+    ref_rows, ref_cols, ref_counts = rows_slice(ref, ref_first, ref_last)
+    num_refs = ref_last - ref_first
+
+    #for each test entry, find the range of reference entries with the same column
+    order = numpy.argsort(ref_cols, kind='mergesort')
+    ref_rows, ref_cols, ref_counts = ref_rows[order], ref_cols[order], ref_counts[order]
+    lo = numpy.searchsorted(ref_cols, test_cols, side='left')
+    hi = numpy.searchsorted(ref_cols, test_cols, side='right')
+    matches = hi - lo
+
+    result = numpy.zeros((last-first)*num_refs, dtype=numpy.int64)
+    total = int(matches.sum())
+    if total:
+        #expand to one entry per (test entry, reference entry) pair
+        test_entry = numpy.repeat(numpy.arange(len(test_cols)), matches)
+        offsets = numpy.cumsum(matches) - matches
+        ref_entry = lo[test_entry] + numpy.arange(total) - offsets[test_entry]
+        clipped = numpy.minimum(test_counts[test_entry], ref_counts[ref_entry])
+        cells = test_rows[test_entry]*num_refs + ref_rows[ref_entry]
+        result += numpy.bincount(cells, weights=clipped, minlength=len(result)).astype(numpy.int64)
+    return result.reshape((last-first, num_refs))
+
+
+# numpy's log and exp may differ from the math module in the last bit, which can change the ranking of alternatives.
+# We use math.exp, and look up the logarithms of the (integer) n-gram counts in a table built with math.log.
+exp = numpy.frompyfunc(math.exp, 1, 1)
+
+def log_table(maxvalue):
+    return numpy.array([0.0] + [math.log(i) for i in range(1, maxvalue+1)])
+
+
+def log_bleu(correct, guess, n, brevity, logs):
+    '''Sentence-level BLEU in the same order of operations as Aligner.eval_sents(), so that results are bit-identical.'''
+    logbleu = numpy.zeros(len(brevity))
+    for k in range(n):
+        logbleu += logs[correct[k]] - logs[guess[k]]
+    logbleu /= n
+    logbleu += numpy.minimum(0, brevity)
+    return exp(logbleu).astype(numpy.float64)
+
+
+def eval_sents(cooked_tests, cooked_targets, n, maxalternatives, bounds=None):
+    '''Score all test sentences, given as (length, counts) with n-gram IDs from cooked_targets.vocab,
+    against all sentences in cooked_targets (a bleu.CookedSentences object);
+    returns a dictionary with the best maxalternatives (score, targetID, correct) tuples for each test sentence.
+    If bounds is given, test sentence i is only compared to the target sentences bounds[i][0] to bounds[i][1].'''
+    vocab = cooked_targets.vocab
+    testlens = numpy.array([test[0] for test in cooked_tests], dtype=numpy.int64)
+    testmatrices = cook_matrix([test[1] for test in cooked_tests], n, vocab)
+
+    # the target matrices are stored with the cooked targets, so they can be reused for other translations
+    if cooked_targets.matrices is None:
+        cooked_targets.matrices = cook_matrix([counts for (length, counts, ngrams) in cooked_targets.cooked], n, vocab)
+    reflens = numpy.array([length for (length, counts, ngrams) in cooked_targets.cooked], dtype=numpy.int64)
+    refmatrices = cooked_targets.matrices
+    num_tests, num_refs = len(testlens), len(reflens)
+    logs = log_table(max([0] + testlens.tolist() + reflens.tolist()))
+
+    scoredict = {}
+    first = 0
+    while first < num_tests:
+        #a block of test sentences is compared to the target sentences within their bounds
+        if bounds is None:
+            last = min(first + max(1, block_cells // max(1, num_refs)), num_tests)
+            ref_first, ref_last = 0, num_refs
+        else:
+            last, ref_first, ref_last = first + 1, bounds[first][0], bounds[first][1] + 1
+            while last < num_tests:
+                lo, hi = min(ref_first, bounds[last][0]), max(ref_last, bounds[last][1] + 1)
+                if (last + 1 - first) * (hi - lo) > block_cells:
+                    break
+                last, ref_first, ref_last = last + 1, lo, hi
+        correct = [clipped_matches(testmatrices[k], refmatrices[k], first, last, ref_first, ref_last) for k in range(n)]
+
+        #only pairs that share at least one n-gram of the highest order have a non-zero score
+        rows, refIDs = numpy.nonzero(correct[n-1])
+        refIDs = refIDs + ref_first
+        correct = [c[rows, refIDs - ref_first] for c in correct]
+        if bounds is not None:
+            lo, hi = numpy.array(bounds[first:last], dtype=numpy.int64).reshape((-1, 2)).T
+            in_band = (refIDs >= lo[rows]) & (refIDs <= hi[rows])
+            rows, refIDs = rows[in_band], refIDs[in_band]
+            correct = [c[in_band] for c in correct]
+        testlen = testlens[first + rows]
+        reflen = reflens[refIDs]
+
+        guess = [numpy.maximum(testlen-k, 0) for k in range(n)]
+        score = log_bleu(correct, guess, n, 1 - reflen/testlen, logs)
+
+        #calculate bleu score in reverse direction
+        guess = [numpy.maximum(reflen-k, 0) for k in range(n)]
+        score2 = log_bleu(correct, guess, n, 1 - testlen/reflen, logs)
+
+        valid = score > 0
+        meanscore = numpy.zeros(len(score))
+        meanscore[valid] = (2*score[valid]*score2[valid])/(score[valid]+score2[valid])
+
+        #sort by test sentence, then by descending score, then by target ID (like a stable sort in the Python version)
+        order = numpy.lexsort((refIDs, -meanscore, rows))
+        order = order[valid[order]]
+        starts = numpy.searchsorted(rows[order], numpy.arange(last-first), side='left')
+        ends = numpy.searchsorted(rows[order], numpy.arange(last-first), side='right')
+
+        correct = numpy.array(correct).T
+        for row in range(last-first):
+            best = order[starts[row]:min(ends[row], starts[row]+maxalternatives)]
+            scoredict[first+row] = [(float(meanscore[i]), int(refIDs[i]), correct[i].tolist()) for i in best]
+        first = last
+
+    return scoredict
+
+
+# backpointers of the dense pathfinder, as in bleualign.align
+UP, LEFT, MATCH = 0, 1, 2
+
+def dense_row(alignments, above, left, c0, c1):
+    '''Like Aligner.dense_row(): one row of the dense score matrix from column c0-1 (which has the score left) to c1,
+    given the same columns of the row above, and the backpointers of columns c0 to c1.
+    alignments maps target IDs to scores. Each cell is the maximum of the cell above, the cell to the left and a match,
+    so the row is a running maximum of the better of the first and the last.'''
+    up = above[1:]
+    match = numpy.full(len(up), -numpy.inf)
+    columns = [j for j in alignments if c0 <= j <= c1]
+    if columns:
+        k = numpy.array(columns, dtype=numpy.int64) - c0
+        match[k] = numpy.array([alignments[j] for j in columns]) + above[k]
+    row = numpy.empty(len(up)+1)
+    row[0] = left
+    numpy.maximum(up, match, out=row[1:])
+    numpy.maximum.accumulate(row, out=row)
+
+    lefts = row[:-1]
+    pointers = numpy.zeros(len(up), dtype=numpy.int8)
+    pointers[lefts > up] = LEFT
+    pointers[match > numpy.maximum(up, lefts)] = MATCH
+    return row, pointers
+
+
+def pathfinder_dense(scoredict, bounds, num_targets):
+    '''Fill the band bounds[i] of each row i of the dense score matrix (see Aligner.pathfinder_dense()).
+    Returns the backpointers of each row (as int8 arrays) and the score of the last cell in the band of each row.'''
+    pointers = []
+    rowmax = []
+    #scores of cells left of the band; they are the same for all following rows.
+    frozen = numpy.zeros(num_targets)
+    previous, previous_lo, previous_hi = None, 0, -1
+
+    for i, (lo, hi) in enumerate(bounds):
+        #columns left of the band of the previous row are frozen, those right of it have the score of the last cell in the band
+        columns = numpy.arange(lo-1, hi+1)
+        above = numpy.zeros(len(columns))
+        if previous is not None:
+            frozen[previous_lo:lo] = previous[numpy.minimum(numpy.arange(previous_lo, lo), previous_hi) - previous_lo]
+            above[columns >= 0] = previous[-1]
+            inside = (columns >= previous_lo) & (columns <= previous_hi)
+            above[inside] = previous[columns[inside] - previous_lo]
+        outside = (columns >= 0) & (columns < previous_lo)
+        above[outside] = frozen[columns[outside]]
+
+        alignments = dict([(target, score) for (score, target, correct) in scoredict[i]])
+        row, row_pointers = dense_row(alignments, above, frozen[lo-1] if lo > 0 else 0, lo, hi)
+        pointers.append(row_pointers)
+        rowmax.append(float(row[-1]))
+        previous, previous_lo, previous_hi = row[1:], lo, hi
+
+    return pointers, rowmax
+
+
+# scores of short beads (see gale_church.length_log_probability()) for each set of Gale & Church parameters,
+# indexed by source and target length. They are computed as they are needed; missing ones are nan.
+length_score_tables = {}
+
+def bucket(lengths):
+    '''gale_church.bucket() for an array of bead lengths.'''
+    shift = numpy.maximum(numpy.frexp(lengths)[1] - gale_church.bucket_bits, 1)
+    rounded = ((lengths + numpy.left_shift(numpy.int64(1), shift - 1)) >> shift) << shift
+    return numpy.where(lengths <= gale_church.exact_length, lengths, rounded)
+
+
+def length_log_probabilities(l_s, l_t, params):
+    '''gale_church.length_log_probability() for arrays of bucketed source and target lengths of beads.'''
+    if params not in length_score_tables:
+        length_score_tables[params] = numpy.full((gale_church.exact_length + 1,)*2, numpy.nan)
+    table = length_score_tables[params]
+    short = (l_s <= gale_church.exact_length) & (l_t <= gale_church.exact_length)
+    scores = numpy.full(len(l_s), numpy.nan)
+    scores[short] = table[l_s[short], l_t[short]]
+    missing = numpy.isnan(scores)
+    if missing.any():
+        score = numpy.frompyfunc(lambda l_s, l_t: gale_church.length_log_probability(int(l_s), int(l_t), params), 2, 1)
+        scores[missing] = score(l_s[missing], l_t[missing]).astype(numpy.float64)
+        new = missing & short
+        table[l_s[new], l_t[new]] = scores[new]
+    return scores
+
+
+def gale_church_align_blocks(source_sentences, target_sentences, params=LanguageIndependent, band=None):
+    '''gale_church.align_blocks(), with the same result: the set of index pairs of the alignment of two lists of sentence lengths.
+    Cell (i, j) of the matrix of log probabilities depends on the cells of the four preceding anti-diagonals, so each anti-diagonal
+    is computed at once, for all bead types, and only the last four are kept. The bead lengths come from prefix sums, and the backpointers are the indices
+    of the bead types in an int8 array per anti-diagonal. With a band, only the cells within it are computed and stored.'''
+    # the bead types in ascending order; if two of them give the same probability, the later one wins, as with max() in align_blocks()
+    types = sorted(params.PRIORS)
+    n, m = len(source_sentences), len(target_sentences)
+    S = numpy.concatenate(([0], numpy.cumsum(source_sentences, dtype=numpy.int64)))
+    T = numpy.concatenate(([0], numpy.cumsum(target_sentences, dtype=numpy.int64)))
+
+    while True:
+        bounds = gale_church.band_bounds(n, m, band)
+        pointers = gale_church_pointers(S, T, bounds, types, params)
+
+        def pointer(i, j):
+            first, row_pointers = pointers[i + j]
+            if first <= i < first + len(row_pointers):
+                return types[row_pointers[i - first]]
+            return None
+
+        if band is None or not gale_church.path_at_band_edge(pointer, bounds, m):
+            break
+        band *= 2
+        if band >= m - 1:
+            band = None
+
+    links = set()
+    i, j = n - 1, m - 1
+    while i != -1 and j != -1:
+        s, t = pointer(i, j)
+        for x in range(s):
+            for y in range(t):
+                links.add((i - x, j - y))
+        i, j = i - s, j - t
+    return links
+
+
+def gale_church_pointers(S, T, bounds, types, params):
+    '''Backpointers of the cells within bounds (see gale_church.band_bounds()), given the prefix sums of the sentence lengths.
+    Returns (first source sentence, int8 array of bead type indices) for each anti-diagonal.'''
+    n, m = len(S) - 1, len(T) - 1
+    a0 = numpy.array([a[0] for a in types]).reshape((-1, 1))
+    a1 = numpy.array([a[1] for a in types]).reshape((-1, 1))
+    log_priors = numpy.array([math.log(params.PRIORS[a]) for a in types]).reshape((-1, 1))
+    substitution = types.index((1, 1))
+
+    # anti-diagonal d holds the cells (i, d-i) with A[i] <= d <= B[i]; both are non-decreasing
+    lo, hi = numpy.array(bounds, dtype=numpy.int64).reshape((-1, 2)).T
+    A = lo + numpy.arange(n)
+    B = hi + numpy.arange(n)
+
+    # log probabilities of the best alignment up to each cell of the last anti-diagonals, as (first source sentence, values).
+    # the boundary of align_blocks() is in anti-diagonals -2 and -1: cells (-1, -1), (-1, 0) and (0, -1) have probability 1.
+    # all other cells outside of the band have probability 0.
+    diagonals = {-2: (-1, numpy.zeros(1)), -1: (-1, numpy.zeros(2))}
+    pointers = []
+
+    for d in range(n + m - 1):
+        i = numpy.arange(numpy.searchsorted(B, d, side='left'), numpy.searchsorted(A, d, side='right'))
+        j = d - i
+        # one row per bead type; beads that start in a cell with probability 0 are not considered
+        k = numpy.full((len(types), len(i)), -numpy.inf)
+        for code, (s, t) in enumerate(types):
+            if d - s - t in diagonals:
+                first, values = diagonals[d - s - t]
+                rows = i - s - first
+                inside = (rows >= 0) & (rows < len(values))
+                k[code, inside] = values[rows[inside]]
+        valid = k > -numpy.inf
+        p = numpy.full(k.shape, -numpy.inf)
+        l_s = bucket((S[i + 1] - S[i + 1 - a0])[valid])
+        l_t = bucket((T[j + 1] - T[j + 1 - a1])[valid])
+        p[valid] = k[valid] + (numpy.broadcast_to(log_priors, k.shape)[valid] + length_log_probabilities(l_s, l_t, params))
+        best = p.max(axis=0)
+        # of the valid bead types with the highest probability, the last one wins
+        best_type = len(types) - 1 - numpy.argmax((valid & (p == best))[::-1], axis=0)
+        best_type[~valid.any(axis=0)] = substitution
+
+        diagonals[d] = (i[0] if len(i) else 0, best)
+        diagonals.pop(d - 4, None)
+        pointers.append((i[0] if len(i) else 0, best_type.astype(numpy.int8)))
+
+    return pointers
@@ -44,18 +44,36 @@ def usage():
     print('\t\tConsider n-grams up to size n for BLEU. Default 2.')
     print('\t' + bold +'--bleu_charlevel' + reset)
     print('\t\tPerform BLEU on charcter-level (recommended for continuous script language; also consider increasing bleu_n).')
+    print('\t' + bold +'--bleu_backend' + reset + ' python|numpy')
+    print('\t\tImplementation of BLEU scoring. numpy scores all sentence pairs of an article at once and is faster on long articles (requires numpy). Default: python.')
+    print('\t' + bold +'--cook_cache' + reset + ' file')
+    print('\t\tKeep normalized sentences in this sqlite3 database, which speeds up repeated runs on the same texts.')
+    print('\n\t' + bold +'--band_width' + reset + ' number')
+    print('\t\tOnly compare sentences close to the diagonal of each article: an integer is the maximal distance in sentences, a number between 0 and 1 the maximal distance relative to the article length. The band is widened automatically if the best alignments touch its edge; results stay close to, but may differ from, a full comparison. Default: compare all sentences.')
+    print('\t' + bold +'--pathfinder' + reset + ' sparse|dense')
+    print('\t\tAlgorithm for finding the best path of 1-to-1 alignments. sparse only looks at candidate sentence pairs and needs much less memory on long articles; both find the same path. Default: sparse.')
+    print('\t' + bold +'--dense_max_cells' + reset + ' int')
+    print('\t\tWith --pathfinder dense, search articles whose score matrix has more cells than this in linear memory (slower). Default: 20000000.')
+    print('\t' + bold +'--anchor_split' + reset + ' int')
+    print('\t\tSplit articles with more than this many sentences into pieces of at least this length, at sentence pairs that share rare n-grams, and align the pieces separately (in parallel with --processes). Useful for long texts without reliable article markers. Default: no splitting.')
+    print('\t' + bold +'--stream_window' + reset + ' int')
+    print('\t\tAlign in a sliding window of this many sentences instead of whole articles, and write out alignments as soon as they are stable. Memory use and latency are bounded on input of any length. Default: align whole articles.')
     print('\n\t' + bold +'--galechurch' + reset)
     print('\t\tAlign the bitext using Gale and Church\'s algorithm (without BLEU comparison).')
+    print('\t' + bold +'--galechurch_band' + reset + ' number')
+    print('\t\tOnly search Gale and Church alignments close to the diagonal of each block: an integer is the maximal distance in sentences, a number between 0 and 1 the maximal distance relative to the block length. The band is widened automatically if needed. Default: search the full block.')
     print('\t' + bold +'--printempty' + reset)
     print('\t\tAlso write unaligned sentences to file. By default, they are discarded.')
     print('\t' + bold +'--verbosity' + reset + ', ' + bold +'-v' + reset + ' int')
     print('\t\tVerbosity. Choose amount of debugging output. Default value 1; choose 0 for (mostly) quiet mode, 2 for verbose output')
     print('\t' + bold +'--processes' + reset + ', ' + bold +'-p' + reset + ' int')
     print('\t\tNumber of parallel processes. Documents are split across available processes. Default: 4.')
+    print('\t' + bold +'--shared_memory' + reset)
+    print('\t\tWith several processes, pass articles to the processes in shared memory instead of copying them. Saves time and memory on very long articles. Requires Python 3.8.')
 
 def load_arguments(sysargv):
     try:
-        opts, args = getopt.getopt(sysargv[1:], "def:ho:s:t:v:p:", ["factored", "filter=", "filterthreshold=", "bleuthreshold=", "filterlang", "printempty", "deveval","eval", "help", "bleu_n=", "bleu_charlevel", "galechurch", "output=", "source=", "target=", "srctotarget=", "targettosrc=", "verbosity=", "printempty=", "processes="])
+        opts, args = getopt.getopt(sysargv[1:], "def:ho:s:t:v:p:", ["factored", "filter=", "filterthreshold=", "bleuthreshold=", "filterlang", "printempty", "deveval","eval", "help", "bleu_n=", "bleu_charlevel", "bleu_backend=", "band_width=", "pathfinder=", "dense_max_cells=", "anchor_split=", "stream_window=", "cook_cache=", "galechurch", "galechurch_band=", "output=", "source=", "target=", "srctotarget=", "targettosrc=", "verbosity=", "printempty=", "processes=", "shared_memory"])
     except getopt.GetoptError as err:
         # print help information and exit:
         print(str(err)) # will print something like "option -a not recognized"
@@ -109,10 +127,28 @@ def load_arguments(sysargv):
             options['filterlang'] = True
         elif o == "--galechurch":
             options['galechurch'] = True
+        elif o == "--galechurch_band":
+            options['galechurch_band'] = float(a) if '.' in a else int(a)
         elif o == "--bleu_n":
             options['bleu_ngrams'] = int(a)
         elif o == "--bleu_charlevel":
             options['bleu_charlevel'] = True
+        elif o == "--bleu_backend":
+            options['bleu_backend'] = a
+        elif o == "--band_width":
+            options['band_width'] = float(a) if '.' in a else int(a)
+        elif o == "--pathfinder":
+            options['pathfinder'] = a
+        elif o == "--dense_max_cells":
+            options['dense_max_cells'] = int(a)
+        elif o == "--anchor_split":
+            options['anchor_split'] = int(a)
+        elif o == "--stream_window":
+            options['stream_window'] = int(a)
+        elif o == "--shared_memory":
+            options['shared_memory'] = True
+        elif o == "--cook_cache":
+            options['cook_cache'] = a
         elif o in ("-s", "--source"):
             if not 'eval' in options:
                 options['srcfile'] = a
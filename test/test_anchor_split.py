@@ -0,0 +1,70 @@
+import unittest
+import os
+import io
+from bleualign.align import Aligner, split_article, find_anchors, multiprocessing_enabled
+
+class TestAnchorSplit(unittest.TestCase):
+	def setUp(self):
+		# eval1957 as a single article without .EOA markers
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		def read(filename, markers):
+			lines = io.open(os.path.join(eval_dir, filename), encoding='UTF-8').read().split('\n')
+			markers = io.open(os.path.join(eval_dir, markers), encoding='UTF-8').read().split('\n')
+			return [line for line, marker in zip(lines, markers) if marker.strip() != '.EOA']
+		self.options = {
+			'srcfile':read('eval1957.de', 'eval1957.de'),
+			'targetfile':read('eval1957.fr', 'eval1957.fr'),
+			'srctotarget':[read('eval1957.google.fr', 'eval1957.de')],
+			'verbosity':0,
+			}
+
+	def align(self, **options):
+		a = Aligner(dict(self.options, **options))
+		a.mainloop()
+		return [stream.getvalue() for stream in a.results()]
+
+	def test_split(self):
+		options = dict(Aligner.default_options, anchor_split = 50)
+		article = (self.options['srcfile'], self.options['targetfile'], self.options['srctotarget'], [])
+		anchors = find_anchors(article[0], article[1], article[2], article[3], options)
+		self.assertTrue(len(anchors) > 50)
+		pieces = split_article(article, options)
+		self.assertTrue(len(pieces) > 2)
+		self.assertEqual((pieces[0][0], pieces[0][2]), (0, 0))
+		self.assertEqual((pieces[-1][1], pieces[-1][3]), (len(article[0]), len(article[1])))
+		for piece, next_piece in zip(pieces, pieces[1:]):
+			self.assertEqual((piece[1], piece[3]), (next_piece[0], next_piece[2]))
+			self.assertTrue(piece[1] - piece[0] >= 50)
+			self.assertTrue((piece[1]-1, piece[3]-1) in anchors and (piece[1], piece[3]) in anchors)
+		self.assertEqual(split_article(article, dict(options, anchor_split = None)), [None])
+
+	def test_same_output(self):
+		# with correct anchors, aligning the pieces separately gives the same result as aligning the whole text
+		full = self.align()
+		self.assertEqual(self.align(anchor_split = 50), full)
+		self.assertEqual(self.align(anchor_split = 50, num_processes = 2), full)
+
+	@unittest.skipUnless(multiprocessing_enabled, 'multiprocessing is not available')
+	def test_cook_once(self):
+		# a worker that receives several pieces of an article (each with a copy of the article) cooks the article once
+		import multiprocessing
+		from bleualign.align import AlignMultiprocessed
+		options = dict(Aligner.default_options, anchor_split = 50, **self.options)
+		article = (self.options['srcfile'], self.options['targetfile'], self.options['srctotarget'], [])
+		pieces = split_article(article, options)
+		tasks, finished = multiprocessing.Queue(), multiprocessing.Queue()
+		for k, piece in enumerate(pieces):
+			tasks.put((k, ((0, k, len(pieces), piece), article)))
+		tasks.put((None, None))
+		cooked = []
+		class Worker(AlignMultiprocessed):
+			def cook_sents(self, sentences):
+				cooked.append(len(sentences))
+				return AlignMultiprocessed.cook_sents(self, sentences)
+		Worker(tasks, options, finished, lambda *args: None).run()
+		results = sorted(finished.get()[0] for piece in pieces)
+		self.assertEqual(results, list(range(len(pieces))))
+		self.assertEqual(cooked, [len(article[1])])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import io
+import re
+from bleualign.align import Aligner, collect_article
+from eval import goldeval
+
+class TestBand(unittest.TestCase):
+	def setUp(self):
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		self.options = {
+			'srcfile':os.path.join(eval_dir, 'eval1989.de'),
+			'targetfile':os.path.join(eval_dir, 'eval1989.fr'),
+			'srctotarget':[os.path.join(eval_dir, 'eval1989.google.fr')],
+			'verbosity':0,
+			}
+
+	def test_banded_pathfinder(self):
+		# banded search finds the same path as the full search, given the same candidates
+		a = Aligner(dict(self.options, pathfinder = 'dense'))
+		for sourcelist, targetlist, translist1, translist2 in collect_article(
+				a.src, a.srctotarget, a.target, a.targettosrc, a.options):
+			if not sourcelist:
+				continue
+			translist = translist1[0]
+			for band in 1, 3, 10:
+				a.scoredict = a.eval_sents(translist, targetlist, band)
+				for i, (lo, hi) in enumerate(a.band_bounds(len(translist), len(targetlist), band)):
+					for score, target, correct in a.scoredict[i]:
+						self.assertTrue(lo <= target <= hi)
+				a.pathfinder(translist, targetlist, band)
+				banded = a.bleualign
+				a.pathfinder(translist, targetlist)
+				self.assertEqual(banded, a.bleualign)
+		a.close_file_streams()
+
+	def test_band_width(self):
+		a = Aligner(dict(self.options, band_width = 5))
+		self.assertEqual(a.band_width(100, 120), 5)
+		self.assertEqual(a.band_width(3, 4), None)
+		a.options['band_width'] = 0.1
+		self.assertEqual(a.band_width(100, 120), 12)
+		a.close_file_streams()
+
+	def test_widening(self):
+		log = io.StringIO()
+		a = Aligner(dict(self.options, band_width = 1, verbosity = 1, log_to = log))
+		a.mainloop()
+		self.assertIn('widening band', log.getvalue())
+		self.assertTrue(a.results()[0].getvalue())
+
+	def f1(self, **options):
+		log = io.StringIO()
+		gold = [None] * len(goldeval.gold1990map)
+		for index, data in goldeval.gold1990map.items():
+			gold[index] = goldeval.gold[data]
+		a = Aligner(dict(self.options, eval = gold, log_to = log, verbosity = 1, **options))
+		a.mainloop()
+		return [float(f) for f in re.findall(r'f1 (?:strict|lax): ([0-9.]+)', log.getvalue())]
+
+	def test_quality(self):
+		# paths that stay inside a narrow band, but use candidates that would lose to better ones outside of it, widen the band
+		full = self.f1()
+		for band in 3, 0.05:
+			for f1, full_f1 in zip(self.f1(band_width = band), full):
+				self.assertTrue(abs(f1 - full_f1) < 0.005, (band, f1, full_f1))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from bleualign.align import Aligner
+from bleualign.cache import TokenCache
+import bleualign.score as bleu
+
+class TestCookCache(unittest.TestCase):
+	def setUp(self):
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		self.tmp_dir = tempfile.mkdtemp()
+		self.cache_file = os.path.join(self.tmp_dir, 'cache.db')
+		self.options = {
+			'srcfile':os.path.join(eval_dir, 'eval1989.de'),
+			'targetfile':os.path.join(eval_dir, 'eval1989.fr'),
+			'srctotarget':[os.path.join(eval_dir, 'eval1989.google.fr')],
+			'verbosity':0,
+			}
+	def tearDown(self):
+		shutil.rmtree(self.tmp_dir)
+
+	def test_same_result(self):
+		outputs = []
+		for options in [{}, {'cook_cache':self.cache_file}, {'cook_cache':self.cache_file}]:
+			options.update(self.options)
+			a = Aligner(options)
+			a.mainloop()
+			output_src, output_target = a.results()
+			outputs.append((output_src.getvalue(), output_target.getvalue()))
+		self.assertEqual(outputs[0], outputs[1])
+		self.assertEqual(outputs[0], outputs[2])
+		# second run finds all sentences in cache
+		self.assertTrue(a.cook_cache.hits > 0)
+		self.assertEqual(a.cook_cache.misses, 0)
+
+	def test_warm_run(self):
+		# a second run over the same corpus does not tokenize any sentence, not even in gaps
+		Aligner(dict(self.options, cook_cache = self.cache_file)).mainloop()
+		calls = []
+		normalize_uncached = bleu.normalize_uncached
+		def counting(s):
+			calls.append(s)
+			return normalize_uncached(s)
+		bleu.normalize_uncached = counting
+		bleu.normalize_memo.clear()
+		try:
+			Aligner(dict(self.options, cook_cache = self.cache_file)).mainloop()
+		finally:
+			bleu.normalize_uncached = normalize_uncached
+		self.assertEqual(calls, [])
+
+	def test_charlevel(self):
+		sentences = ['Das ist ein Satz.', 'Noch ein &quot;Satz&quot;', 'Das ist ein Satz.']
+		cache = TokenCache(self.cache_file)
+		self.assertEqual(cache.normalize(sentences), [bleu.normalize(s) for s in sentences])
+		self.assertEqual(cache.normalize(sentences, True), [bleu.normalize(tuple(s)) for s in sentences])
+		self.assertEqual(cache.normalize(sentences, True), [bleu.normalize(tuple(s)) for s in sentences])
+		self.assertEqual(cache.misses, 4)
+		cache.close()
+
+	def test_eviction(self):
+		cache = TokenCache(self.cache_file, max_entries = 10)
+		for i in range(5):
+			cache.normalize(['sentence {0} {1}'.format(i, j) for j in range(4)])
+		cache.close()
+		size = sqlite3.connect(self.cache_file).execute('SELECT COUNT(*) FROM tokens').fetchone()[0]
+		self.assertEqual(size, 10)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import os
+import io
+import bleualign.align
+from bleualign.align import Aligner, collect_article, numpy_enabled
+import bleualign.score as bleu
+
+class TestEvalSents(unittest.TestCase):
+	def setUp(self):
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		self.options = {
+			'srcfile':os.path.join(eval_dir, 'eval1989.de'),
+			'targetfile':os.path.join(eval_dir, 'eval1989.fr'),
+			'srctotarget':[os.path.join(eval_dir, 'eval1989.europarlfull.fr')],
+			'verbosity':0,
+			}
+
+	def test_pruning(self):
+		# pruning by score bound must not change the best alternatives
+		a = Aligner(self.options)
+		pruned = 0
+		for sourcelist, targetlist, translist1, translist2 in collect_article(
+				a.src, a.srctotarget, a.target, a.targettosrc, a.options):
+			if not sourcelist:
+				continue
+			a.options['maxalternatives'] = 3
+			scoredict = a.eval_sents(translist1[0], targetlist)
+			pruned += a.pruned_pairs
+			a.options['maxalternatives'] = len(targetlist)
+			full = a.eval_sents(translist1[0], targetlist)
+			self.assertEqual(a.pruned_pairs, 0)
+			for testID in full:
+				self.assertEqual(scoredict[testID], full[testID][:3])
+		self.assertTrue(pruned > 0)
+		a.close_file_streams()
+
+	def test_cook_once(self):
+		# with several translations, each side of an article is only cooked once
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		options = dict(self.options)
+		options['srctotarget'] = [os.path.join(eval_dir, 'eval1989.europarlfull.fr'),
+			os.path.join(eval_dir, 'eval1989.google.fr')]
+		options['targettosrc'] = [os.path.join(eval_dir, 'eval1989.google.de')]
+		a = Aligner(options)
+		cooked = []
+		cook_sents = a.cook_sents
+		def counting_cook_sents(sentences):
+			cooked.append(sentences)
+			return cook_sents(sentences)
+		a.cook_sents = counting_cook_sents
+		for sourcelist, targetlist, translist1, translist2 in collect_article(
+				a.src, a.srctotarget, a.target, a.targettosrc, a.options):
+			del cooked[:]
+			a.process(sourcelist, targetlist, translist1, translist2)
+			if sourcelist and targetlist:
+				self.assertEqual(len([s for s in cooked if s is targetlist]), 1)
+				self.assertEqual(len([s for s in cooked if s is sourcelist]), 1)
+		a.close_file_streams()
+
+	def test_upper_bound(self):
+		a = Aligner(self.options)
+		for testlen in range(2, 30):
+			for reflen in range(2, 30):
+				bound = a.bleu_upper_bound(testlen, reflen)
+				self.assertTrue(bound <= 1.0)
+				self.assertTrue(bound >= a.bidirectional_bleu([1, 1], testlen, reflen))
+		a.close_file_streams()
+
+	def test_ngram_vocabulary(self):
+		# counting n-gram IDs gives the same counts as counting n-gram tuples
+		vocab = bleu.NgramVocabulary()
+		def decode(ngramID):
+			key = keys[ngramID]
+			if vocab.order[ngramID] == 0:
+				return (key,)
+			return decode(key[0]) + (key[1],)
+		for sent in ['a b c a b', 'b c a b c d', 'a', '', 'a b c a b']:
+			words = bleu.normalize(sent)
+			idcounts = vocab.count_ngrams(words, 3)
+			keys = dict((ngramID, key) for key, ngramID in vocab.ids.items())
+			decoded = dict((decode(ngramID), count) for ngramID, count in idcounts.items())
+			self.assertEqual(decoded, bleu.count_ngrams(words, 3))
+			for ngramID in idcounts:
+				self.assertEqual(vocab.order[ngramID], len(decode(ngramID))-1)
+
+	def test_concatenate(self):
+		# cooking a concatenation from its parts gives the same result as cooking the joined string
+		sents = [line.strip() for line in open(self.options['srcfile'])][:60] + ['', 'a', '1', '.5', '-x']
+		for n in (1, 2, 4):
+			vocab = bleu.NgramVocabulary()
+			parts = [vocab.cook_part(bleu.normalize(sent), n) for sent in sents]
+			for i in range(len(sents)-2):
+				combined = vocab.concatenate(vocab.concatenate(parts[i], parts[i+1], n), parts[i+2], n)
+				self.assertEqual(combined, vocab.cook_part(bleu.normalize(' '.join(sents[i:i+3])), n))
+
+	def test_score_gaps(self):
+		# scoring the gaps of an article in one batch gives the same scores as scoring each gap on its own
+		a = Aligner(dict(self.options, Nto1 = 3))
+		backends = ['python', 'numpy'] if numpy_enabled else ['python']
+		for sourcelist, targetlist, translist1, translist2 in collect_article(
+				a.src, a.srctotarget, a.target, a.targettosrc, a.options):
+			if not sourcelist:
+				continue
+			a.scoredict = a.eval_sents(translist1[0], targetlist)
+			a.pathfinder(translist1[0], targetlist)
+			postgaps = [((src,), (target,)) for src, target in a.bleualign] + [((), ())]
+			pregaps = [((), ())] + postgaps[:-1]
+			gaps = [a.find_gap(pre, post, translist1[0], targetlist) + (pre, post) for pre, post in zip(pregaps, postgaps)]
+			gaps = [gap for gap in gaps if gap[0] or gap[1]]
+			self.assertTrue(len(gaps) > 1)
+			for backend in backends:
+				a.options['bleu_backend'] = backend
+				single = [a.score_gaps([gap], translist1[0], targetlist)[0] for gap in gaps]
+				self.assertEqual(a.score_gaps(gaps, translist1[0], targetlist), single)
+		a.close_file_streams()
+
+	def test_score_cache(self):
+		# gapfiller() reuses scores of the first pass, which does not change the alignment
+		def align(distance):
+			log = io.StringIO()
+			cache_distance = bleualign.align.score_cache_distance
+			bleualign.align.score_cache_distance = distance
+			try:
+				a = Aligner(dict(self.options, verbosity = 2, log_to = log))
+				a.mainloop()
+			finally:
+				bleualign.align.score_cache_distance = cache_distance
+			return [stream.getvalue() for stream in a.results()], log.getvalue()
+		output, log = align(32)
+		self.assertTrue('reused first-pass scores for ' in log)
+		self.assertEqual(align(-1)[0], output)
+		self.assertTrue('reused first-pass scores for 0 ' in align(-1)[1])
+
+if __name__ == '__main__':
+	unittest.main()
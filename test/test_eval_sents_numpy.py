@@ -0,0 +1,55 @@
+import unittest
+import os
+import io
+from bleualign.align import Aligner, collect_article, numpy_enabled
+
+@unittest.skipUnless(numpy_enabled, 'numpy is not installed')
+class TestEvalSentsNumpy(unittest.TestCase):
+	def setUp(self):
+		self.eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+
+	def test_eval1957(self):
+		self._sameScores('eval1957.de', 'eval1957.fr', 'eval1957.europarlfull.fr')
+	def test_eval1989(self):
+		self._sameScores('eval1989.de', 'eval1989.fr', 'eval1989.google.fr')
+	def test_eval1989_charlevel(self):
+		self._sameScores('eval1989.de', 'eval1989.fr', 'eval1989.google.fr',
+			bleu_charlevel = True, bleu_ngrams = 3)
+	def test_invalid_backend(self):
+		self.assertRaises(ValueError, Aligner, {
+			'srcfile':os.path.join(self.eval_dir, 'eval1989.de'),
+			'targetfile':os.path.join(self.eval_dir, 'eval1989.fr'),
+			'no_translation_override':True, 'bleu_backend':'fortran'})
+
+	def test_pruning_log(self):
+		# only the Python backend prunes candidate pairs, and reports how many
+		for backend in 'python', 'numpy':
+			log = io.StringIO()
+			Aligner({
+				'srcfile':os.path.join(self.eval_dir, 'eval1989.de'),
+				'targetfile':os.path.join(self.eval_dir, 'eval1989.fr'),
+				'srctotarget':[os.path.join(self.eval_dir, 'eval1989.google.fr')],
+				'bleu_backend':backend, 'verbosity':1, 'log_to':log}).mainloop()
+			self.assertEqual('candidate sentence pairs' in log.getvalue(), backend == 'python')
+
+	def _sameScores(self, src, target, srctotarget, **options):
+		options.update({
+			'srcfile':os.path.join(self.eval_dir, src),
+			'targetfile':os.path.join(self.eval_dir, target),
+			'srctotarget':[os.path.join(self.eval_dir, srctotarget)],
+			'verbosity':0,
+			})
+		a = Aligner(options)
+		for sourcelist, targetlist, translist1, translist2 in collect_article(
+				a.src, a.srctotarget, a.target, a.targettosrc, a.options):
+			if not sourcelist:
+				continue
+			a.options['bleu_backend'] = 'python'
+			python_scores = a.eval_sents(translist1[0], targetlist)
+			a.options['bleu_backend'] = 'numpy'
+			numpy_scores = a.eval_sents(translist1[0], targetlist)
+			self.assertEqual(python_scores, numpy_scores)
+		a.close_file_streams()
+
+if __name__ == '__main__':
+	unittest.main()
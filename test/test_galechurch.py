@@ -2,8 +2,11 @@
 import unittest
 from command_utils import load_arguments
 import os
+import math
+import random
 import bleualign
-from bleualign.align import Aligner
+from bleualign.align import Aligner, numpy_enabled, link_beads
+from bleualign.gale_church import align_blocks, band_bounds, bucket, length_log_probability, align_probability, LanguageIndependent
 from test.utils import Utils
 
 class TestGaleChurch(unittest.TestCase, Utils):
@@ -31,5 +34,76 @@ class TestGaleChurch(unittest.TestCase, Utils):
 		for result_path, refer_path, output_object in compare_files:
 			self.cmp_files(result_path, refer_path, output_object)
 
+class TestGaleChurchScores(unittest.TestCase):
+	def test_log_probability(self):
+		# the same probabilities as align_probability(), which multiplies them
+		for l_s, l_t in ((10, 10), (10, 30), (0, 5), (100, 160), (0, 229)):
+			self.assertAlmostEqual(math.exp(length_log_probability(l_s, l_t, LanguageIndependent)),
+				align_probability(0, 0, [l_s], [l_t], (1, 1), LanguageIndependent) / LanguageIndependent.PRIORS[(1, 1)], places=15)
+		# where that probability rounds to 0, beads are still impossible
+		self.assertEqual(length_log_probability(0, 553, LanguageIndependent), -float('inf'))
+		# an empty source sentence and two long target sentences: (0, 1) alone has probability 0, so the 1-to-2 bead wins
+		self.assertEqual(sorted(align_blocks([0], [229, 324])), [(0, 0), (0, 1)])
+	def test_gaps(self):
+		# a gap of eval1957 with the above sentences, filled by Gale & Church
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		a = Aligner({
+			'srcfile':os.path.join(eval_dir, 'eval1957.de'),
+			'targetfile':os.path.join(eval_dir, 'eval1957.fr'),
+			'srctotarget':[os.path.join(eval_dir, 'eval1957.google.fr')],
+			'targettosrc':[os.path.join(eval_dir, 'eval1957.google.de')],
+			'verbosity':0,
+			})
+		a.mainloop()
+		output_src, output_target = a.results()
+		self.assertEqual(len(output_src.getvalue().split('\n')), 312)
+		self.assertIn('Hervorragend gezeichnete Panoramen', output_src.getvalue())
+	def test_bucket(self):
+		self.assertEqual([bucket(length) for length in (0, 512, 513, 1001, 1002, 70000)], [0, 512, 512, 1000, 1004, 70144])
+
+class TestLinkBeads(unittest.TestCase):
+	def test_link_beads(self):
+		# a 2-to-1, 1-to-1, 1-to-2 and 2-to-2 bead; source 3 and target 4 are not aligned
+		links = set([(0, 0), (1, 0), (2, 1), (4, 2), (4, 3), (5, 5), (5, 6), (6, 5), (6, 6)])
+		self.assertEqual(link_beads(links), [((0, 1), (0,)), ((2,), (1,)), ((4,), (2, 3)), ((5, 6), (5, 6))])
+		self.assertEqual(link_beads(set()), [])
+
+class TestGaleChurchBand(unittest.TestCase):
+	def test_same_alignment(self):
+		rand = random.Random(0)
+		source = [rand.randint(10, 200) for i in range(300)]
+		target = [int(length * rand.uniform(0.8, 1.3)) for length in source]
+		self.assertEqual(align_blocks(source, target, band=10), align_blocks(source, target))
+	def test_widening(self):
+		# 20 target sentences without counterpart push the path away from the diagonal
+		rand = random.Random(1)
+		source = [rand.randint(10, 200) for i in range(100)]
+		target = source[:50] + [rand.randint(10, 200) for i in range(20)] + source[50:]
+		bounds = band_bounds(len(source), len(target), 2)
+		self.assertTrue(any(not lo <= j <= hi for (i, j) in align_blocks(source, target) for (lo, hi) in [bounds[i]]))
+		self.assertEqual(align_blocks(source, target, band=2), align_blocks(source, target))
+
+@unittest.skipUnless(numpy_enabled, 'numpy is not installed')
+class TestGaleChurchNumpy(unittest.TestCase):
+	def test_same_alignment(self):
+		from bleualign.vectorized import gale_church_align_blocks
+		rand = random.Random(0)
+		for trial in range(1000):
+			# short blocks with many empty and equal sentences, which give ties
+			source = [rand.choice([0, 1, 2, 5, rand.randint(0, 300)]) for i in range(rand.randint(0, 12))]
+			target = [rand.choice([0, 1, 3, rand.randint(0, 300)]) for i in range(rand.randint(0, 12))]
+			self.assertEqual(gale_church_align_blocks(source, target), align_blocks(source, target))
+		source = [rand.randint(10, 200) for i in range(300)]
+		target = [int(length * rand.uniform(0.8, 1.3)) for length in source]
+		self.assertEqual(gale_church_align_blocks(source, target), align_blocks(source, target))
+	def test_same_alignment_band(self):
+		from bleualign.vectorized import gale_church_align_blocks
+		rand = random.Random(0)
+		for trial in range(300):
+			source = [rand.choice([0, 1, 2, 5, rand.randint(0, 300)]) for i in range(rand.randint(0, 12))]
+			target = [rand.choice([0, 1, 3, rand.randint(0, 300)]) for i in range(rand.randint(0, 12))]
+			for band in (1, 2, 3):
+				self.assertEqual(gale_church_align_blocks(source, target, band=band), align_blocks(source, target, band=band))
+
 if __name__ == '__main__':
 	unittest.main()
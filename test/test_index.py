@@ -0,0 +1,89 @@
+import unittest
+import os
+import io
+import shutil
+import tempfile
+from bleualign.align import Aligner, collect_article, read_article
+from bleualign.index import ArticleIndex
+
+class TestArticleIndex(unittest.TestCase):
+	def setUp(self):
+		self.eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		self.tmp_dir = tempfile.mkdtemp()
+		self.options = dict(Aligner.default_options)
+	def tearDown(self):
+		shutil.rmtree(self.tmp_dir)
+
+	def write(self, name, text):
+		path = os.path.join(self.tmp_dir, name)
+		with io.open(path, 'w', encoding='UTF-8', newline='') as f:
+			f.write(text)
+		return path
+
+	def assertSameArticles(self, src, srctotarget, target, targettosrc):
+		def read(path):
+			return io.open(path, encoding='UTF-8')
+		articles = list(collect_article(read(src), [read(path) for path in srctotarget], read(target), [read(path) for path in targettosrc], self.options))
+		index = ArticleIndex(src, srctotarget, target, targettosrc, self.options['end_of_article_marker'])
+		self.assertEqual([read_article(index, i, self.options) for i in range(len(index))], articles)
+
+	def test_eval(self):
+		self.assertSameArticles(os.path.join(self.eval_dir, 'eval1989.de'),
+			[os.path.join(self.eval_dir, 'eval1989.google.fr'), os.path.join(self.eval_dir, 'eval1989.europarlfull.fr')],
+			os.path.join(self.eval_dir, 'eval1989.fr'), [os.path.join(self.eval_dir, 'eval1989.google.de')])
+
+	def test_boundaries(self):
+		for k, (src, target, translation) in enumerate([
+				# more articles in the target text
+				('a\nb\n.EOA\nc\n', 'x\n.EOA\ny\nz\n.EOA\nw\n', 'ta\ntb\nt.EOA\ntc\n'),
+				# marker at the end, short translation
+				('a\n.EOA\n', 'x\n.EOA\n', 'ta\n'),
+				# no line break at the end, marker with trailing whitespace, empty translation
+				('a\n.EOA', 'x\n.EOA  \n\n', ''),
+				('', '', ''),
+				('a\r\n.EOA\r\nb\r\n', 'x\r\n.EOA\r\ny', 'ta\r\nt\r\ntb\r\n'),
+				# lines that only start with the marker, or contain it, and non-ASCII text
+				('ä\n.EOAx\n.EOA\nü\n', 'x\n .EOA\n.EOA\n', 'éé\n\n\n\n\n'),
+				# long translation
+				('a\n.EOA\nb\n.EOA\nc\n', 'x\n', 't1\nt2\nt3\nt4\nt5\nt6\nt7\n')]):
+			self.assertSameArticles(self.write('src%d' % k, src), [self.write('translation%d' % k, translation)], self.write('target%d' % k, target), [])
+
+	def test_line_breaks(self):
+		# universal newlines would also break lines at a single \r
+		self.assertRaises(ValueError, ArticleIndex, self.write('src', 'a\rb\n'), [], self.write('target', 'x\n'), [], '.EOA')
+
+	def test_same_output(self):
+		options = {
+			'srcfile':os.path.join(self.eval_dir, 'eval1957.de'),
+			'targetfile':os.path.join(self.eval_dir, 'eval1957.fr'),
+			'srctotarget':[os.path.join(self.eval_dir, 'eval1957.google.fr')],
+			'verbosity':0,
+			}
+		outputs = []
+		for num_processes in (1, 2):
+			a = Aligner(dict(options, num_processes=num_processes))
+			self.assertTrue(a.article_index() is not None)
+			a.mainloop()
+			outputs.append([stream.getvalue() for stream in a.results()])
+		self.assertEqual(outputs[0], outputs[1])
+
+	def test_same_statistics(self):
+		# workers only send the first-pass results that print_alignment_statistics() needs at verbosity 2
+		statistics = []
+		for num_processes in (1, 2):
+			log = io.StringIO()
+			a = Aligner({
+				'srcfile':os.path.join(self.eval_dir, 'eval1957.de'),
+				'targetfile':os.path.join(self.eval_dir, 'eval1957.fr'),
+				'srctotarget':[os.path.join(self.eval_dir, 'eval1957.google.fr')],
+				'verbosity':2,
+				'log_to':log,
+				'num_processes':num_processes,
+				})
+			a.mainloop()
+			statistics.append([line for line in log.getvalue().split('\n') if 'best cand' in line or 'aligned by BLEU' in line])
+		self.assertTrue(len(statistics[0]) > 10)
+		self.assertEqual(statistics[0], statistics[1])
+
+if __name__ == '__main__':
+	unittest.main()
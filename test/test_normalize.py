@@ -0,0 +1,66 @@
+import unittest
+import os
+import io
+import re
+import xml.sax.saxutils
+import bleualign.score as bleu
+
+class TestNormalize(unittest.TestCase):
+	def setUp(self):
+		bleu.normalize_memo.clear()
+
+	# normalization as done before the single-pass tokenizer
+	def reference(self, s):
+		try:
+			s.split()
+		except:
+			s = " ".join(s)
+		for (pattern, replace) in bleu.normalize1:
+			s = re.sub(pattern, replace, s)
+		s = xml.sax.saxutils.unescape(s, {'&quot;':'"'})
+		s = (" %s " % s).lower()
+		return [tok for tok in bleu.normalize3.split(s) if tok and tok != ' ']
+
+	def test_eval_corpora(self):
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		for filename in 'eval1989.de', 'eval1989.fr', 'eval1957.google.fr':
+			with io.open(os.path.join(eval_dir, filename), encoding='UTF-8') as f:
+				for line in f:
+					line = line.rstrip('\n')
+					self.assertEqual(bleu.normalize(line), self.reference(line))
+					self.assertEqual(bleu.normalize(line), self.reference(line))
+					self.assertEqual(bleu.normalize(tuple(line)), self.reference(tuple(line)))
+
+	def test_special_cases(self):
+		for s in ['3.5 Mio.', '1,000,000 -5 3-4 a-b', '.5 ,5 5. 5,', 'x&amp;y &quot;z&quot; &lt;b&gt;',
+				'ab<skipped>cd', 'Zeilen-\numbruch\nhier', '\t(a)[b]{c}', '', ' ', 'ABC_def@ghi/jkl']:
+			self.assertEqual(bleu.normalize(s), self.reference(s))
+
+	def test_memo(self):
+		size = bleu.normalize_memo_size
+		bleu.normalize_memo_size = 5
+		try:
+			words = bleu.normalize('Ein Satz.')
+			words.append('changed')
+			self.assertEqual(bleu.normalize('Ein Satz.'), ['ein', 'satz', '.'])
+			for i in range(10):
+				bleu.normalize('Satz {0}'.format(i))
+			self.assertEqual(len(bleu.normalize_memo), 5)
+		finally:
+			bleu.normalize_memo_size = size
+
+	def test_memo_per_article(self):
+		from bleualign.align import Aligner
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		size = bleu.normalize_memo_size
+		try:
+			a = Aligner({'srcfile':os.path.join(eval_dir, 'eval1989.de'), 'targetfile':os.path.join(eval_dir, 'eval1989.fr'),
+				'srctotarget':[os.path.join(eval_dir, 'eval1989.google.fr')], 'verbosity':0, 'normalize_memo_size':300})
+			a.mainloop()
+			# only (part of) the last article is remembered
+			self.assertTrue(0 < len(bleu.normalize_memo) <= 300)
+		finally:
+			bleu.normalize_memo_size = size
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os
+import io
+import random
+import bleualign.align
+from bleualign.align import Aligner, collect_article
+
+class TestPathfinder(unittest.TestCase):
+	def setUp(self):
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		self.options = {
+			'srcfile':os.path.join(eval_dir, 'eval1989.de'),
+			'targetfile':os.path.join(eval_dir, 'eval1989.fr'),
+			'srctotarget':[os.path.join(eval_dir, 'eval1989.google.fr')],
+			'verbosity':0,
+			}
+
+	def paths(self, a, translist, targetlist):
+		a.options['pathfinder'] = 'dense'
+		a.pathfinder(translist, targetlist)
+		dense = a.bleualign
+		a.options['pathfinder'] = 'sparse'
+		a.pathfinder(translist, targetlist)
+		return dense, a.bleualign
+
+	def test_eval_corpus(self):
+		a = Aligner(self.options)
+		for sourcelist, targetlist, translist1, translist2 in collect_article(
+				a.src, a.srctotarget, a.target, a.targettosrc, a.options):
+			if not sourcelist:
+				continue
+			a.scoredict = a.eval_sents(translist1[0], targetlist)
+			dense, sparse = self.paths(a, translist1[0], targetlist)
+			self.assertTrue(sparse)
+			self.assertEqual(dense, sparse)
+		a.close_file_streams()
+
+	def test_ties(self):
+		# with few distinct scores, many paths have the same score; both pathfinders must pick the same one
+		a = Aligner(self.options)
+		rand = random.Random(1)
+		for trial in range(500):
+			num_tests, num_targets = rand.randint(1, 10), rand.randint(1, 10)
+			a.scoredict = {}
+			for i in range(num_tests):
+				targets = rand.sample(range(num_targets), rand.randint(0, min(num_targets, 4)))
+				a.scoredict[i] = [(rand.choice([0.25, 0.5, 0.75, 1.0]), j, [1]) for j in targets]
+			dense, sparse = self.paths(a, list(range(num_tests)), list(range(num_targets)))
+			self.assertEqual(dense, sparse)
+		a.close_file_streams()
+
+	def test_linear_memory(self):
+		# the divide-and-conquer search finds the same path as the dense search, also when split into tiny regions
+		a = Aligner(self.options)
+		rand = random.Random(2)
+		block_cells = bleualign.align.linear_block_cells
+		try:
+			for bleualign.align.linear_block_cells in (1, 6):
+				for trial in range(300):
+					num_tests, num_targets = rand.randint(1, 12), rand.randint(1, 12)
+					a.scoredict = {}
+					for i in range(num_tests):
+						targets = rand.sample(range(num_targets), rand.randint(0, min(num_targets, 4)))
+						a.scoredict[i] = [(rand.choice([0.25, 0.5, rand.random()]), j, [1]) for j in targets]
+					a.pathfinder_dense(list(range(num_tests)), list(range(num_targets)))
+					dense = a.bleualign
+					a.pathfinder_linear(list(range(num_tests)), list(range(num_targets)))
+					self.assertEqual(dense, a.bleualign)
+		finally:
+			bleualign.align.linear_block_cells = block_cells
+		a.close_file_streams()
+
+	def test_linear_memory_switch(self):
+		log = io.StringIO()
+		a = Aligner(dict(self.options, pathfinder = 'dense', dense_max_cells = 100, verbosity = 2, log_to = log))
+		a.mainloop()
+		self.assertIn('searching in linear memory', log.getvalue())
+		b = Aligner(self.options)
+		b.mainloop()
+		self.assertEqual(a.results()[0].getvalue(), b.results()[0].getvalue())
+		self.assertEqual(a.results()[1].getvalue(), b.results()[1].getvalue())
+
+	@unittest.skipUnless(bleualign.align.numpy_enabled, 'numpy is not installed')
+	def test_numpy_rows(self):
+		# the dense pathfinder fills rows with numpy if it is installed; the result is the same as with arrays
+		a = Aligner(dict(self.options, pathfinder = 'dense'))
+		for sourcelist, targetlist, translist1, translist2 in collect_article(
+				a.src, a.srctotarget, a.target, a.targettosrc, a.options):
+			if not sourcelist:
+				continue
+			for band in None, 5:
+				a.scoredict = a.eval_sents(translist1[0], targetlist, band)
+				a.pathfinder(translist1[0], targetlist, band)
+				vectorized = a.bleualign
+				try:
+					bleualign.align.numpy_enabled = 0
+					a.pathfinder(translist1[0], targetlist, band)
+				finally:
+					bleualign.align.numpy_enabled = 1
+				self.assertEqual(vectorized, a.bleualign)
+		a.close_file_streams()
+
+	def test_invalid(self):
+		self.assertRaises(ValueError, Aligner, dict(self.options, pathfinder = 'fast'))
+
+	def test_gapfinder(self):
+		a = Aligner(self.options)
+		sentences = ['a b c d', 'e f g h', 'i j k l', 'm n o p']
+		a.bleualign = [(0, 0), (3, 3)]
+		a.gapfinder(sentences, sentences)
+		self.assertEqual(sorted(a.multialign), [(((0,), (0,)), 'BLEU'), (((1,), (1,)), 'GAPFILLER'),
+			(((2,), (2,)), 'GAPFILLER'), (((3,), (3,)), 'BLEU')])
+		self.assertEqual(a.multialign.pairs, set(pair for pair, aligntype in a.multialign))
+		a.close_file_streams()
+
+if __name__ == '__main__':
+	unittest.main()
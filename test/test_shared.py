@@ -0,0 +1,52 @@
+import unittest
+import os
+from bleualign.align import Aligner, shared_memory_enabled
+if shared_memory_enabled:
+	from bleualign.shared import share_article
+
+@unittest.skipUnless(shared_memory_enabled, 'multiprocessing.shared_memory is not available')
+class TestSharedArticle(unittest.TestCase):
+	def attach(self, article, factored):
+		block, shared = share_article(article, factored).attach()
+		self.addCleanup(block.unlink)
+		self.addCleanup(block.close)
+		return shared
+
+	def test_sentences(self):
+		article = (['a b', 'ä', ''], ['x', 'y z'], [['ta b', 'tä', 't']], [])
+		sourcelist, targetlist, translist1, translist2 = self.attach(article, False)
+		self.assertEqual((list(sourcelist), list(targetlist), [list(t) for t in translist1], translist2), article)
+		self.assertEqual(sourcelist[-1], '')
+		self.assertEqual(list(sourcelist[1:]), ['ä', ''])
+		self.assertEqual(list(sourcelist[1:][1:5]), [''])
+		self.assertEqual(sourcelist[::2], ['a b', ''])
+		self.assertRaises(IndexError, lambda: sourcelist[3])
+
+	def test_factored(self):
+		article = ([('a', 'a|A'), ('b', 'b|B')], [('x', 'x|X')], [], [['tx']])
+		sourcelist, targetlist, translist1, translist2 = self.attach(article, True)
+		self.assertEqual((list(sourcelist), list(targetlist), translist1, [list(t) for t in translist2]), article)
+		self.assertEqual(sourcelist[1], ('b', 'b|B'))
+
+	def test_empty(self):
+		sourcelist, targetlist, translist1, translist2 = self.attach(([], [], [[]], []), False)
+		self.assertEqual((len(sourcelist), len(targetlist), len(translist1[0])), (0, 0, 0))
+
+	def test_same_output(self):
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		options = {
+			'srcfile':os.path.join(eval_dir, 'eval1957.de'),
+			'targetfile':os.path.join(eval_dir, 'eval1957.fr'),
+			'srctotarget':[os.path.join(eval_dir, 'eval1957.google.fr')],
+			'verbosity':0,
+			}
+		for anchor_split in (None, 30):
+			outputs = []
+			for num_processes, shared_memory in ((1, False), (2, True)):
+				a = Aligner(dict(options, num_processes=num_processes, shared_memory=shared_memory, anchor_split=anchor_split))
+				a.mainloop()
+				outputs.append([stream.getvalue() for stream in a.results()])
+			self.assertEqual(outputs[0], outputs[1])
+
+if __name__ == '__main__':
+	unittest.main()
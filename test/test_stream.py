@@ -0,0 +1,95 @@
+import unittest
+import os
+import io
+from bleualign.align import Aligner
+
+class CountingStringIO(io.StringIO):
+	# counts the lines that have been read
+	def __init__(self, text):
+		io.StringIO.__init__(self, text)
+		self.lines_read = 0
+
+	def __next__(self):
+		self.lines_read += 1
+		return io.StringIO.__next__(self)
+	next = __next__
+
+class TestStream(unittest.TestCase):
+	def setUp(self):
+		eval_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eval')
+		self.options = {
+			'srcfile':os.path.join(eval_dir, 'eval1957.de'),
+			'targetfile':os.path.join(eval_dir, 'eval1957.fr'),
+			'srctotarget':[os.path.join(eval_dir, 'eval1957.google.fr')],
+			'verbosity':0,
+			}
+
+	def align(self, **options):
+		a = Aligner(dict(self.options, **options))
+		a.mainloop()
+		return [stream.getvalue().split('\n') for stream in a.results()]
+
+	def test_whole_articles(self):
+		# a window that holds each article gives the same result as aligning whole articles
+		self.assertEqual(self.align(stream_window = 10000), self.align())
+
+	def test_small_window(self):
+		full = set(zip(*self.align()))
+		pairs = set(zip(*self.align(stream_window = 60)))
+		self.assertTrue(len(full & pairs) > 0.95 * len(full))
+
+	def test_no_empty_pairs(self):
+		# windows without a kept alignment write nothing
+		for window in (2, 10, 60):
+			for output in self.align(stream_window = window):
+				self.assertEqual(output[-1], '')
+				self.assertFalse('' in output[:-1])
+
+	def test_printempty(self):
+		# unaligned sentences are printed as in whole articles, also if they are cut off from a window without alignment
+		def missing(output, path):
+			text = '\n'.join(output)
+			lines = [line.strip() for line in io.open(path, encoding='UTF-8')]
+			return set(line for line in lines if line and line != '.EOA' and line not in text)
+		full = self.align(printempty = True)
+		for window in (10, 20):
+			output = self.align(printempty = True, stream_window = window)
+			self.assertEqual(missing(output[0], self.options['srcfile']), missing(full[0], self.options['srcfile']))
+			self.assertEqual(missing(output[1], self.options['targetfile']), missing(full[1], self.options['targetfile']))
+
+	def test_bounded_filter(self):
+		# with a filter, sentence pairs are written for each window instead of at the end
+		source = io.open(self.options['srcfile'], encoding='UTF-8').read()
+		src = CountingStringIO(source)
+		lines_read = []
+		class Output(io.StringIO):
+			def write(self, text):
+				lines_read.append(src.lines_read)
+				return io.StringIO.write(self, text)
+		a = Aligner(dict(self.options, srcfile = src, filter = 'sentences', filterthreshold = 90,
+			**{'stream_window': 20, 'output-src': Output(), 'output-src-bad': io.StringIO(), 'output-target-bad': io.StringIO()}))
+		a.mainloop()
+		self.assertTrue(lines_read[0] <= 40)
+		self.assertTrue(a.results_bad()[0].getvalue())
+		self.assertEqual(a.sources_out, [])
+
+	def test_bounded_input(self):
+		# output is written while the input is still being read
+		source = io.open(self.options['srcfile'], encoding='UTF-8').read()
+		src = CountingStringIO(source)
+		lines_read = []
+		class Output(io.StringIO):
+			def write(self, text):
+				lines_read.append(src.lines_read)
+				return io.StringIO.write(self, text)
+		a = Aligner(dict(self.options, srcfile = src, **{'stream_window': 20, 'output-src': Output()}))
+		a.mainloop()
+		self.assertTrue(lines_read[0] <= 40)
+		self.assertTrue(lines_read[-1] >= len(source.splitlines()))
+
+	def test_invalid(self):
+		self.assertRaises(ValueError, Aligner, dict(self.options, stream_window = 1))
+		self.assertRaises(ValueError, Aligner, dict(self.options, stream_window = 10, eval = [[]]))
+
+if __name__ == '__main__':
+	unittest.main()